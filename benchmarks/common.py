@@ -0,0 +1,61 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+
+import os
+import sys
+import types
+import importlib
+from time import perf_counter
+
+
+
+pluginFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), r'..', r'plugin', r'metagedit')
+
+
+
+def pluginModule( name ):
+    # imports one of the plugin's modules without running its __init__.py, which needs a
+    # running gedit; the modules themselves still need python3-gi and gedit's schemas
+    if (r'metagedit' not in sys.modules):
+        package = types.ModuleType(r'metagedit')
+        package.__path__ = [os.path.normpath(pluginFolder)]
+        sys.modules[r'metagedit'] = package
+    return importlib.import_module(r'metagedit.' + name)
+
+
+
+def bestTime( function, *args, repeat=3 ):
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        function(*args)
+        elapsed = perf_counter() - start
+        if ((best is None) or (elapsed < best)): best = elapsed
+    return best
+
+
+
+def report( label, seconds, baseline=None ):
+    line = label.ljust(48, r' ') + (r'%9.1f ms' % (seconds * 1000))
+    if (baseline): line += r'   (%.2fx)' % (baseline / seconds)
+    print(line)
+
+
+
+def argument( position, default ):
+    return int(sys.argv[position]) if (len(sys.argv) > position) else default
@@ -0,0 +1,67 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/dedup.py [number of lines] [distinct lines]
+# Compares time and peak memory of the set-based dedup against the hashed (digest) one.
+
+import gc
+import tracemalloc
+from random import Random
+
+from common import pluginModule, bestTime, report, argument
+
+textManipulation = pluginModule(r'textManipulation')
+
+
+
+def sampleLines( count, distinct ):
+    random = Random(count)
+    return [(r'2020-01-01 12:00:00 worker-%d: request %d finished with status %d' %
+             (i % 16, random.randrange(distinct), (200 + (i % 3)))) for i in range(count)]
+
+
+
+def peakMemory( function, *args ):
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+
+if (__name__ == r'__main__'):
+    lines = sampleLines(argument(1, 2000000), argument(2, 1000000))
+    print(str(len(lines)) + r' lines')
+    # case-insensitive, as the "Remove Duplicates" menu entries do
+    backends = ((r'set of lines', lambda: textManipulation._duplicatesRemoved(
+                                            lines, False, hashed=False)),
+                (r'128-bit digests', lambda: textManipulation._hashedDuplicatesRemoved(
+                                                lines, False)),
+                (r'64-bit digests', lambda: textManipulation._hashedDuplicatesRemoved(
+                                                lines, False, digestSize=8)),
+                (r'128-bit digests, verified', lambda: textManipulation._hashedDuplicatesRemoved(
+                                                        lines, False, verify=True)))
+    baseline = None
+    for label, backend in backends:
+        seconds = bestTime(backend, repeat=1)
+        report(label, seconds, baseline)
+        if (baseline is None): baseline = seconds
+        print(r'    peak memory: %.1f MiB' % (peakMemory(backend) / (1024 * 1024)))
@@ -0,0 +1,45 @@
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/encodingRanking.py [sample size in KiB]
+# Times the ranking of every supported encoding for a Windows-1251 (Russian) sample, with
+# and without the language filter, and shows the best ranked candidates.
+
+from common import pluginModule, bestTime, report, argument
+
+textManipulation = pluginModule(r'textManipulation')
+encodingsAndLanguages = pluginModule(r'encodingsAndLanguages')
+
+
+
+def sampleBytes( size ):
+    sentence = r'Съешь же ещё этих мягких французских булок, да выпей чаю. '
+    text = (sentence * ((size // len(sentence)) + 1))[:size]
+    return text.encode(r'cp1251')
+
+
+
+if (__name__ == r'__main__'):
+    sample = sampleBytes(argument(1, 1024) * 1024)
+    encodings = encodingsAndLanguages.supportedEncodings()
+    print(r'%d bytes, %d encodings' % (len(sample), len(encodings)))
+    for language in (r'mul', r'rus'):
+        ranking = []
+        seconds = bestTime(lambda: ranking.append(textManipulation.rankEncodings(
+                                       sample, encodings, language)))
+        report(r'ranking (language: ' + language + r')', seconds)
+        print(r'    best: ' + r', '.join(ranking[-1][:5]))
@@ -0,0 +1,64 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/sortKeys.py [number of lines]
+# Compares building sort keys with the old per-line re.sub() lambda against _sortKeys().
+
+import re
+from random import Random
+
+from common import pluginModule, bestTime, report, argument
+
+textManipulation = pluginModule(r'textManipulation')
+
+
+
+def sampleLines( count ):
+    random = Random(count)
+    samples = []
+    for i in range(count):
+        kind = i % 4
+        if (kind == 0):
+            samples.append(r'file' + str(random.randrange(100000)) + r'.log')
+        elif (kind == 1):
+            samples.append(r'%d.%d.%d' % (random.randrange(9), random.randrange(30), random.randrange(300)))
+        elif (kind == 2):
+            samples.append(r'%d,Name %d,%0.2f' % (random.randrange(10**6), i, random.random() * 1000))
+        else:
+            samples.append(r'  Some Words\tand   Spaces ' + str(random.randrange(1000)))
+    return samples
+
+
+
+if (__name__ == r'__main__'):
+    lines = sampleLines(argument(1, 1000000))
+    print(str(len(lines)) + r' lines')
+    oldKey = lambda x: re.sub(r'\s+', r'', x[0:].casefold())
+    baseline = bestTime(lambda: [oldKey(line) for line in lines])
+    report(r'old lambda (re.sub + casefold)', baseline)
+    report(r'_sortKeys, Text', bestTime(textManipulation._sortKeys, lines), baseline)
+    for mode in textManipulation.sortModes[1:]:
+        report(r'_sortKeys, ' + mode, bestTime(textManipulation._sortKeys, lines, mode), baseline)
+    report(r'_sortKeys, Natural, columns 2,1 (",")',
+           bestTime(textManipulation._sortKeys, lines, r'Natural', False, 0, r',', (2, 1)),
+           baseline)
+    sortBaseline = bestTime(lambda: sorted(lines, key=oldKey))
+    report(r'old sorted(key=lambda)', sortBaseline)
+    keys = lambda: textManipulation._sortKeys(lines)
+    report(r'new precomputed keys + index sort',
+           bestTime(lambda: sorted(range(len(lines)), key=keys().__getitem__)), sortBaseline)
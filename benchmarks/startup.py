@@ -0,0 +1,66 @@
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/startup.py [number of runs] [number of imports listed]
+# Times importing the plugin's modules (each run in a fresh interpreter) and lists the
+# imports that took the longest, going by 'python3 -X importtime'.
+# The time each do_activate() takes (app, window and view) is written to stderr by gedit
+# itself when started as 'METAGEDIT_TIMING=1 gedit --standalone'.
+
+import os
+import re
+import sys
+import subprocess
+
+from common import pluginFolder, argument
+
+
+
+_importer = (r'import sys, types; package = types.ModuleType("metagedit"); ' +
+             r'package.__path__ = [%r]; sys.modules["metagedit"] = package; ' +
+             r'import metagedit.dialogs') % os.path.normpath(pluginFolder)
+_importTime = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+
+def importTimes():
+    # {module: (own microseconds, cumulative microseconds, nesting level)} for one fresh run
+    run = subprocess.run([sys.executable, r'-X', r'importtime', r'-c', _importer],
+                         stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = dict()
+    for line in run.stderr.splitlines():
+        match = _importTime.match(line)
+        if (match is not None):
+            own, cumulative, indentation, module = match.groups()
+            times[module] = (int(own), int(cumulative), (len(indentation) // 2))
+    return times
+
+
+
+if (__name__ == r'__main__'):
+    runs = [importTimes() for i in range(argument(1, 5))]
+    best = dict()
+    for times in runs:
+        for module, (own, cumulative, level) in times.items():
+            if ((module not in best) or (cumulative < best[module][1])):
+                best[module] = (own, cumulative, level)
+    total = best[r'metagedit.dialogs'][1]
+    print(r'importing metagedit.dialogs: %.1f ms (best of %d runs)' % ((total / 1000), len(runs)))
+    print(r'    slowest imports (cumulative, own):')
+    slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for module, (own, cumulative, level) in slowest[:argument(2, 20)]:
+        print(r'    %s%9.1f ms %9.1f ms' % (module.ljust(40, r' '), (cumulative / 1000), (own / 1000)))
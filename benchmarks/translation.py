@@ -0,0 +1,94 @@
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/translation.py [size in KiB] [round-trip latency in ms]
+# Translates with a local stand-in server (which upper-cases text after some latency), one
+# 14000-character piece after another (as translation used to), and then with the chunks
+# cut on sentence boundaries and sent by the pool of translators, then once more with a
+# (temporary) translation memory, first empty and then filled.
+
+import os
+import threading
+from tempfile import TemporaryDirectory
+from time import sleep
+from textwrap import wrap as textWrap
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.request import urlopen, Request
+
+from common import pluginModule, bestTime, report, argument
+
+textManipulation = pluginModule(r'textManipulation')
+storage = pluginModule(r'storage')
+
+
+
+class StandInServer(BaseHTTPRequestHandler):
+    latency = 0.3 # seconds
+
+    def do_POST( self ):
+        text = self.rfile.read(int(self.headers[r'Content-Length']))
+        sleep(self.latency)
+        self.send_response(200)
+        self.send_header(r'Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text.upper())
+
+    def log_message( self, *arguments ):
+        pass
+
+def standInTranslator( url ):
+    return lambda text, to: urlopen(Request(url, text.encode(r'utf-8'))).read().decode(r'utf-8')
+
+def oneAfterAnother( text, translated ):
+    result = r''
+    for chunk in textWrap(text, 14000, expand_tabs=False, replace_whitespace=False,
+                          drop_whitespace=False):
+        result += translated(chunk, r'en')
+    return result
+
+def pooled( text, translated, memory=None ):
+    with ThreadPoolExecutor(max_workers=textManipulation.translationWorkers) as translators:
+        translations = textManipulation._chunkTranslations(text, r'en', translated, translators,
+                                                           memory)
+        return r''.join((before + future.result() + after) for before, future, after in translations)
+
+def sampleText( size ):
+    paragraph = (r'The quick brown fox jumps over the lazy dog. Is it lazy? It is! ' * 12) + '\n\n'
+    paragraphs = [(r'%d. ' % i) + paragraph for i in range((size // len(paragraph)) + 1)]
+    return r''.join(paragraphs)[:size]
+
+
+
+if (__name__ == r'__main__'):
+    StandInServer.latency = argument(2, 300) / 1000
+    server = ThreadingHTTPServer((r'127.0.0.1', 0), StandInServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    translated = standInTranslator(r'http://127.0.0.1:%d/' % server.server_port)
+    text = sampleText(argument(1, 512) * 1024)
+    print(r'%d characters, %d ms per request' % (len(text), (StandInServer.latency * 1000)))
+    baseline = bestTime(oneAfterAnother, text, translated, repeat=1)
+    report(r'14000-character pieces, one after another', baseline)
+    report(r'sentence-aware chunks, %d at a time' % textManipulation.translationWorkers,
+           bestTime(pooled, text, translated, repeat=1), baseline)
+    with TemporaryDirectory() as folder:
+        memory = storage.TranslationMemory(os.path.join(folder, r'translations.sqlite'))
+        for label in (r'translation memory, empty', r'translation memory, filled'):
+            report(r'sentence-aware chunks, ' + label, bestTime(pooled, text, translated, memory, repeat=1),
+                   baseline)
+        print(r'    %d chunks kept, %d hits, %d misses' % memory.statistics())
+    server.shutdown()
@@ -0,0 +1,59 @@
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/transliteration.py [size in MiB]
+# Compares "Aggressively Convert to ASCII" as NFKD plus a per-character comprehension (the
+# old way) against the cached translation table, for mostly-ASCII and for accented text.
+
+from unicodedata import normalize as unicodeNormalize, combining as unicodeCombining
+
+from common import pluginModule, bestTime, report, argument
+
+textManipulation = pluginModule(r'textManipulation')
+encodingsAndLanguages = pluginModule(r'encodingsAndLanguages')
+
+
+
+def comprehension( text ):
+    text = unicodeNormalize(r'NFKD', text)
+    return r''.join([c for c in text if not unicodeCombining(c)])
+
+def translationTable( text ):
+    return textManipulation.ASCIITransliterated(text)
+
+def translationTableInChunks( text, chunkSize=(1024 * 1024) ):
+    # as redecode() does it, where ASCII-only chunks are left alone
+    return r''.join(textManipulation.ASCIITransliterated(text[i:(i + chunkSize)])
+                    for i in range(0, len(text), chunkSize))
+
+def sampleText( size, sentence ):
+    return (sentence * ((size // len(sentence)) + 1))[:size]
+
+
+
+if (__name__ == r'__main__'):
+    size = argument(1, 16) * 1024 * 1024
+    report(r'building the table (once)', bestTime(encodingsAndLanguages.ASCIITable, repeat=1))
+    samples = ((r'accented', sampleText(size, r'Crème brûlée, “naïve” façade – déjà vu… ')),
+               (r'mostly ASCII', (sampleText((size - 64), r'plain old ASCII text, line after line\n') +
+                                  sampleText(64, r'Ærøskøbing, ﬁnally. '))))
+    for label, text in samples:
+        print(r'%s (%d characters)' % (label, len(text)))
+        baseline = bestTime(comprehension, text)
+        report(r'    NFKD + comprehension', baseline)
+        report(r'    translation table', bestTime(translationTable, text), baseline)
+        report(r'    translation table, 1 MiB chunks', bestTime(translationTableInChunks, text), baseline)
@@ -0,0 +1,61 @@
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 benchmarks/windowActivation.py [number of windows]
+# Compares building every dialog up front for each window (as window activation used to)
+# against creating them on first use; needs a display.
+
+import gi
+gi.require_version(r'Gtk', r'3.0')
+from gi.repository import Gtk
+
+from common import pluginModule, bestTime, report, argument
+
+dialogs = pluginModule(r'dialogs')
+
+
+
+def windowDialogClasses():
+    classes = [(dialogs.EncodingDialog, ()), (dialogs.PercentEncodeDialog, ()),
+               (dialogs.SortDialog, ()), (dialogs.SaveSessionDialog, (r'/tmp/',)),
+               (dialogs.ManageSessionsDialog, (r'/tmp/',)), (dialogs.DocumentStatsDialog, ()),
+               (dialogs.PickColorDialog, ())]
+    if (dialogs.translationIsAvailable):
+        classes.append((dialogs.TranslationLanguagesDialog, ()))
+    return classes
+
+def upFront( windows ):
+    for window in windows:
+        for dialogClass, arguments in windowDialogClasses(): dialogClass(window, *arguments)
+
+def onFirstUse( windows ):
+    # activation creates nothing; then each window opens its encoding dialog once
+    for window in windows: dialogs.windowDialog(window, dialogs.EncodingDialog)
+
+def freshWindows( count ):
+    # a new set each round, so windowDialog() can't reuse the dialogs of the previous one
+    return [Gtk.Window() for i in range(count)]
+
+
+
+if (__name__ == r'__main__'):
+    count = argument(1, 4)
+    print(str(count) + r' windows')
+    baseline = bestTime(lambda: upFront(freshWindows(count)))
+    report(r'every dialog built at activation', baseline)
+    report(r'only the encoding dialog, on first use', bestTime(lambda: onFirstUse(freshWindows(count))),
+           baseline)
@@ -17,7 +17,10 @@
 # =============================================================================================
 
 import os
-from time import time as nowTime
+import sys
+from secrets import token_hex
+from time import time as nowTime, perf_counter
+_importStart = perf_counter()
 import gi
 gi.require_version(r'Gedit', r'3.0')
 gi.require_version(r'Gtk', r'3.0')
@@ -25,6 +28,7 @@ from gi.repository import GLib, GObject, Gio, Gtk, GtkSource, Gdk, Gedit
 
 from .textManipulation import *
 from .dialogs import *
+from .storage import backgroundWriter, encodingCache, SessionIndex
 
 
 
@@ -32,8 +36,30 @@ settings = Gio.Settings.new(r'org.gnome.gedit.plugins.metagedit')
 _homeFolder = os.environ[r'HOME']
 ## SESSIONS
 sessionsFolder = _homeFolder + r'/.config/gedit/metagedit-sessions/'
+sessionIndex = SessionIndex(sessionsFolder)
+_autosaveDelay = 500 # milliseconds from a change to the session being saved
+_eagerSessionNeighbours = 1 # tabs on each side of the active one loaded right away on lazy loading
+_missingFilesListed = 10 # at most, in the infobar telling which files of a session are missing
 ## RESTORE UNSAVED DOCUMENTS
 unsavedsFolder = _homeFolder + r'/.cache/gedit/metagedit-backups/'
+## STARTUP TIMING
+_startupTiming = (r'METAGEDIT_TIMING' in os.environ)
+
+
+
+def _reportTime( label, start ):
+    print((r'metagedit: %s took %.2f ms' % (label, ((perf_counter() - start) * 1000))), file=sys.stderr)
+
+def _timed( activate ):
+    # with METAGEDIT_TIMING set, how long each do_activate() takes goes to stderr
+    if (not _startupTiming): return activate
+    def timedActivate( self ):
+        start = perf_counter()
+        activate(self)
+        _reportTime((type(self).__name__ + r'.do_activate'), start)
+    return timedActivate
+
+if (_startupTiming): _reportTime(r'importing the plugin', _importStart)
 
 
 
@@ -49,7 +75,14 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
     def _updateEncodingStatus( self, document ):
         ## ENCODING STUFF
         if (document and document.get_file().get_encoding() is not None):
-            self._encodingStatusLabel.set_label(document.get_file().get_encoding().get_charset())
+            charset = document.get_file().get_encoding().get_charset()
+            self._encodingStatusLabel.set_label(charset)
+            self._encodingStatusLabel.set_tooltip_text(None)
+            detection = cachedDocumentEncoding(document) # from a previous detection
+            if ((detection is not None) and (detection[0].casefold() != charset.casefold())):
+                self._encodingStatusLabel.set_label(charset + r' (' + detection[0] + r'?)')
+                self._encodingStatusLabel.set_tooltip_text(r'Previously detected as %s (%d%% confidence)'
+                                                           % (detection[0], round(detection[1] * 100)))
             self._encodingStatusLabel.show()
         else:
             self._encodingStatusLabel.hide()
@@ -87,6 +120,7 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
     def _closeTabIfJunk( self, tab ):
         if ((tab is None) or (tab.get_state() != 0)): return
         document = tab.get_document()
+        if (hasattr(document, r'metageditPlaceholder')): return
         if (document.get_file().get_location() is not None): return
         if ((document.can_undo()) or (document.can_redo())): return
         #content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
@@ -99,7 +133,9 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         ## OPEN AS ADMIN
         self.window.lookup_action(r'open-as-admin').set_enabled(self._allowOpenAsAdmin())
         ## SESSIONS
-        self._autosaveSession(2)
+        if ((not self._resumingSession) and hasattr(tab.get_document(), r'metageditPlaceholder')):
+            GLib.idle_add(self._loadPlaceholderTab, tab)
+        self._sessionChanged()
 
     def _onActiveTabStateChange( self, window ):
         ## ENCODING STUFF
@@ -116,27 +152,57 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             self._switchTabs(key in switchKeys[:2])
 
     def _onDocumentSave( self, document, data=None ):
+        ## LINE OPERATIONS
+        finishApplying(document) # nothing half-applied gets saved
         ## REMOVE TRAILING SPACES
         removeTrailingSpaces(document, True)
 
     def _onTabAdded( self, window, tab, data=None ):
         tab.get_document().connect(r'save', self._onDocumentSave)
+        ## ENCODING STUFF
+        if (not hasattr(tab.get_document(), r'metageditIdentityHandlers')):
+            tab.get_document().metageditIdentityHandlers = (
+                    tab.get_document().connect(r'loaded', forgetFileIdentity),
+                    tab.get_document().connect(r'saved', forgetFileIdentity))
+        ## REMOVE TRAILING SPACES
+        if (not hasattr(tab.get_document(), r'metageditDirtyLines')):
+            tab.get_document().metageditDirtyLines = DirtyLines(tab.get_document())
+            # a tab still loading resets it once loaded
+            if (tab.get_state() == Gedit.TabState.STATE_NORMAL): tab.get_document().metageditDirtyLines.reset()
         ## SESSIONS
-        if (self._lastSessionResuming > (nowTime() - 1)): self._closeTabIfJunk(tab)
-        self._autosaveSession(0)
+        if ((not self._resumingSession) and (self._lastSessionResuming > (nowTime() - 1))):
+            self._closeTabIfJunk(tab)
+        self._sessionChanged()
+        ## RESTORE UNSAVED DOCUMENTS
+        document = tab.get_document()
+        if ((not self._resumingSession) and (not hasattr(document, r'metageditJournal')) and
+            (document.get_file().get_location() is None) and
+            (settings.get_value(r'resume-session').get_boolean())):
+            self._journalDocument(document)
 
     def _onTabRemoved( self, window, tab, data=None ):
+        ## LINE OPERATIONS
+        cancelApplying(tab.get_document())
+        document = tab.get_document()
+        ## ENCODING STUFF
+        if (hasattr(document, r'metageditIdentityHandlers')):
+            for handler in document.metageditIdentityHandlers: document.disconnect(handler)
+            delattr(document, r'metageditIdentityHandlers')
         ## SESSIONS
-        self._autosaveSession(0)
+        self._sessionChanged()
+        if (hasattr(document, r'metageditPlaceholder')):
+            if (hasattr(document, r'metageditPlaceholderHandler')):
+                document.disconnect(document.metageditPlaceholderHandler)
+                delattr(document, r'metageditPlaceholderHandler')
+            return
         ## RESTORE UNSAVED DOCUMENTS
-        document = tab.get_document()
-        if ((not self._quitting) and (document.get_file().get_location() is None)):
-            backupPath = unsavedsFolder + document.get_short_name_for_display()
-            if (os.path.isfile(backupPath)): os.remove(backupPath)
+        if ((not self._quitting) and hasattr(document, r'metageditJournal')):
+            document.metageditJournal.discard()
+            delattr(document, r'metageditJournal')
 
     def _onTabsReordered( self, window, data=None ):
         ## SESSIONS
-        self._autosaveSession(0)
+        self._sessionChanged()
 
     def _onWindowShow( self, window, data=None ):
         ## SESSIONS
@@ -147,37 +213,65 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
     def _onQuit( self, application=None, user_data=None ):
         ## SESSIONS
         self._quitting = True
-        if (len(self.window.get_application().get_windows()) == 1):
+        self._cancelSessionFlush()
+        # while a session is still being loaded, the previous one is still the one to resume
+        if ((len(self.window.get_application().get_windows()) == 1) and
+            (self._sessionValidation is None)):
             self.saveSession()
+        for document in self.window.get_documents():
+            if (hasattr(document, r'metageditJournal')): document.metageditJournal.flush()
+        backgroundWriter.flush() # the backups must be all written before gedit is gone
+        ## ENCODING STUFF
+        encodingCache.flush()
         ## RESTORE UNSAVED DOCUMENTS
         if (settings.get_value(r'resume-session').get_boolean()):
             for tab in self.window.get_active_tab().get_parent().get_children():
                 tab.get_document().set_modified(False)
 
+    def _journalDocument( self, document, path=None, restored=None ):
+        ## RESTORE UNSAVED DOCUMENTS
+        # the document's backup, kept up to date by its edits (see EditJournal)
+        if (path is None): path = unsavedsFolder + document.get_short_name_for_display() + r' ' + token_hex(4)
+        document.metageditJournal = EditJournal(document, path, self._sessionChanged, *(restored or ()))
+        return document.metageditJournal
+
     def _unsavedDocumentBackup( self, document ):
         ## RESTORE UNSAVED DOCUMENTS
-        content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
-        if ((len(content) < 1) or (re.match(r'^\s+$', content))): return None
-        name = document.get_short_name_for_display()
-        try: open((unsavedsFolder + name), r'w').write(content)
-        except: return None
-        return (r'unsaved://' + name)
+        journal = getattr(document, r'metageditJournal', None)
+        if (journal is None): journal = self._journalDocument(document)
+        if (not journal.started):
+            content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
+            if ((len(content) < 1) or content.isspace()): return None
+            journal.start(content)
+        elif (document.get_char_count() < 1): # nothing to keep, so no backup left behind
+            journal.discard()
+            self._journalDocument(document)
+            return None
+        journal.flush()
+        return (r'unsaved://' + os.path.basename(journal.path))
 
     def _currentSession( self, includeUnsaved ):
         ## SESSIONS
-        if (self.window.get_active_document() is None): return
-        while (self._resumingSession): pass
+        if (self.window.get_active_document() is None): return None
         tabs = self.window.get_active_tab().get_parent().get_children()
         session = []
         for tab in tabs:
             document = tab.get_document()
             active = r'x' if (tab == self.window.get_active_tab()) else r' '
-            line = str(document.get_iter_at_mark(document.get_insert()).get_line() + 1)
-            column = str(document.get_iter_at_mark(document.get_insert()).get_line_offset() + 1)
-            encoding = document.get_file().get_encoding()
+            placeholder = getattr(document, r'metageditPlaceholder', None)
+            if (placeholder is not None):
+                uri, encoding, line, column = placeholder
+                line, column = str(line), str(column)
+            else:
+                line = str(document.get_iter_at_mark(document.get_insert()).get_line() + 1)
+                column = str(document.get_iter_at_mark(document.get_insert()).get_line_offset() + 1)
+                encoding = document.get_file().get_encoding()
             encoding = (r' ' * 16) if (encoding is None) else encoding.get_charset().ljust(16, r' ')
             info = active + '\t' + line.ljust(6, r' ') + '\t'
             info += column.ljust(6, r' ') + '\t' + encoding + '\t'
+            if (placeholder is not None):
+                session.append(info + uri)
+                continue
             if (document.get_file().get_location() is None):
                 ## RESTORE UNSAVED DOCUMENTS
                 if (includeUnsaved):
@@ -195,26 +289,48 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         sessionAction.connect(r'activate', lambda a, p: self.loadSession(sessionName))
         self.window.add_action(sessionAction)
 
-    def _autosaveSession( self, minimumIntervalInSecs ):
+    def _sessionChanged( self ):
+        ## SESSIONS
+        # the session gets saved once, a bit later, however many changes come in the meantime
+        self._sessionIsDirty = True
+        if (self._autosaveSource is None):
+            self._autosaveSource = GLib.timeout_add(_autosaveDelay, self._flushSession)
+
+    def _flushSession( self ):
+        ## SESSIONS
+        self._autosaveSource = None
+        if (self._resumingSession): return False # loadSession() calls _sessionChanged() when done
+        if (self._sessionIsDirty):
+            self._sessionIsDirty = False
+            self._autosaveSession()
+        return False
+
+    def _cancelSessionFlush( self ):
+        ## SESSIONS
+        if (self._autosaveSource is not None): GLib.source_remove(self._autosaveSource)
+        self._autosaveSource = None
+
+    def _autosaveSession( self ):
         ## SESSIONS
         if (self._resumingSession or self._quitting): return
         if (not settings.get_value(r'resume-session').get_boolean()): return
-        if ((not minimumIntervalInSecs) or
-            (self._lastSessionAutosave < (nowTime() - minimumIntervalInSecs))):
-            self.saveSession()
-            self._lastSessionAutosave = nowTime()
+        self.saveSession()
 
     def saveSession( self, sessionName=None ):
         ## SESSIONS
         isAutomaticAction = sessionName is None
         session = self._currentSession(isAutomaticAction)
+        if (session is None): return
         if (isAutomaticAction):
             session = [re.sub(r'^(.*?) *(\t.*?) *(\t.*?) *(\t.*?) *(\t.+)$', r'\1\2\3\4\5', entry)
                         for entry in session]
+            if (session == self._lastSavedSession): return # unchanged
             settings.set_value(r'previous-session', GLib.Variant(r'as', session))
+            self._lastSavedSession = session
         else:
             try: open(sessionsFolder + sessionName, r'x').write('\n'.join(session))
             except: return
+            sessionIndex.update(sessionName)
             self.registerSession(sessionName)
             self.window.get_application().metageditActivatable.updateMenuSessions()
 
@@ -225,8 +341,10 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             tab = self.window.create_tab(isActive)
             document = tab.get_document()
             try:
-                document.insert_at_cursor(open(uri, r'r').read())
-                os.remove(uri)
+                restored = restoreJournaled(document, uri)
+                journal = self._journalDocument(document, uri, restored)
+                if (restored is None):
+                    journal.start(document.get_text(document.get_start_iter(), document.get_end_iter(), False))
                 cursorPosition = document.get_iter_at_mark(document.get_insert())
                 cursorPosition.set_line(line - 1)
                 cursorPosition.set_line_offset(column - 1)
@@ -238,6 +356,50 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             gfile = Gio.File.new_for_uri(uri)
             self.window.create_tab_from_location(gfile, encoding, line, column, True, isActive)
 
+    def _createPlaceholderTab( self, uri, encoding, line, column ):
+        ## SESSIONS
+        # an empty tab standing for a document of the session, only loaded once activated; it
+        # can't be edited, and only its label goes by the document's file (it isn't given the
+        # file, so that neither Save nor Reload can act on the file from it)
+        tab = self.window.create_tab(False)
+        document = tab.get_document()
+        document.metageditPlaceholder = (uri, encoding, line, column)
+        document.metageditPlaceholderHandler = document.connect(r'loaded', self._onPlaceholderLoaded)
+        tab.get_view().set_editable(False)
+        tab.get_view().set_cursor_visible(False)
+        name = Gio.File.new_for_uri(uri).get_parse_name()
+        tabLabel = tab.get_parent().get_tab_label(tab)
+        tabLabel.set_tooltip_text(name)
+        labels = [tabLabel]
+        while (len(labels) > 0):
+            label = labels.pop()
+            if (isinstance(label, Gtk.Label)): label.set_text(GLib.filename_display_basename(name))
+            elif (isinstance(label, Gtk.Container)): labels += label.get_children()
+
+    def _onPlaceholderLoaded( self, document, *arguments ):
+        ## SESSIONS
+        # a file got loaded into the placeholder itself (e.g. as gedit opens files in an
+        # untouched tab), so it stands for nothing anymore
+        document.disconnect(document.metageditPlaceholderHandler)
+        del document.metageditPlaceholder, document.metageditPlaceholderHandler
+        view = Gedit.Tab.get_from_document(document).get_view()
+        view.set_editable(True)
+        view.set_cursor_visible(True)
+        self._sessionChanged()
+
+    def _loadPlaceholderTab( self, tab ):
+        ## SESSIONS
+        if ((tab.get_parent() is None) or (not hasattr(tab.get_document(), r'metageditPlaceholder'))):
+            return False
+        uri, encoding, line, column = tab.get_document().metageditPlaceholder
+        notebook = tab.get_parent()
+        position = notebook.page_num(tab)
+        gfile = Gio.File.new_for_uri(uri)
+        loadedTab = self.window.create_tab_from_location(gfile, encoding, line, column, False, True)
+        if (loadedTab.get_parent() is notebook): notebook.reorder_child(loadedTab, position)
+        self.window.close_tab(tab)
+        return False
+
     def loadSession( self, sessionName=None ):
         ## SESSIONS
         self._resumingSession = True
@@ -245,7 +407,9 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             sessionEntries = settings.get_value(r'previous-session').get_strv()
         else:
             try: sessionEntries = open(sessionsFolder + sessionName, r'r').read().splitlines()
-            except: return
+            except:
+                self._resumingSession = False
+                return
         openTabs = set()
         if (settings.get_value(r'replace-session-on-load').get_boolean()):
             self.window.close_all_tabs()
@@ -253,9 +417,12 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             for tab in self.window.get_active_tab().get_parent().get_children():
                 self._closeTabIfJunk(tab)
             openTabs = self.window.get_active_tab().get_parent().get_children()
-            openTabs = [tab.get_document().get_uri_for_display() for tab in openTabs]
+            openTabs = [(tab.get_document().metageditPlaceholder[0]
+                         if hasattr(tab.get_document(), r'metageditPlaceholder')
+                         else tab.get_document().get_uri_for_display()) for tab in openTabs]
             openTabs = set([re.sub(r'^/', r'file:///', tab) for tab in openTabs])
         #if (len(openTabs) == 1): self._closeTabIfJunk(self.window.get_active_tab())
+        toCreate = []
         for entry in sessionEntries:
             active, line, column, encoding, toOpen = tuple(entry.split('\t', 4))
             if (toOpen in openTabs): continue
@@ -263,9 +430,98 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             encoding = encoding.strip()
             if (encoding == r''): encoding = None
             else: encoding = gi.repository.GtkSource.Encoding.get_from_charset(encoding)
-            self._createTab(toOpen, encoding, int(line), int(column), active)
+            toCreate.append((toOpen, encoding, int(line), int(column), active))
+        toValidate = [entry[0] for entry in toCreate if (not entry[0].startswith(r'unsaved://'))]
+        self._validateSessionFiles(toValidate, (lambda missing: self._createSessionTabs(toCreate, missing)))
+
+    def _validateSessionFiles( self, uris, whenDone ):
+        ## SESSIONS
+        # asks GIO about all the files at once, then calls whenDone(missing) once all have
+        # answered or 'session-validation-timeout' milliseconds have passed (the ones yet to
+        # answer by then count as missing, so a dead mount can't hold a whole session back)
+        cancellable = Gio.Cancellable()
+        self._sessionValidation = cancellable
+        pending = set(uris)
+        missing = set()
+        timeoutSource = []
+        def finish():
+            if (self._sessionValidation is not cancellable): return # done, or given up on
+            self._sessionValidation = None
+            if (len(timeoutSource) > 0): GLib.source_remove(timeoutSource[0])
+            cancellable.cancel()
+            missing.update(pending)
+            whenDone(missing)
+        def onTimeout():
+            timeoutSource.clear()
+            finish()
+            return False
+        def onInfo( gfile, result, uri ):
+            try: gfile.query_info_finish(result)
+            except: missing.add(uri)
+            pending.discard(uri)
+            if (len(pending) == 0): finish()
+        if (len(pending) == 0): return finish()
+        timeout = settings.get_value(r'session-validation-timeout').get_uint32()
+        timeoutSource.append(GLib.timeout_add(timeout, onTimeout))
+        for uri in pending.copy():
+            Gio.File.new_for_uri(uri).query_info_async(r'standard::type', Gio.FileQueryInfoFlags.NONE,
+                                                       GLib.PRIORITY_DEFAULT, cancellable, onInfo, uri)
+
+    def _cancelSessionValidation( self ):
+        ## SESSIONS
+        if (self._sessionValidation is not None): self._sessionValidation.cancel()
+        self._sessionValidation = None
+        self._resumingSession = False
+
+    def _createSessionTabs( self, toCreate, missing ):
+        ## SESSIONS
+        toCreate = [entry for entry in toCreate if (entry[0] not in missing)]
+        # on lazy loading, only the active tab and its neighbours (and unsaved documents) load now
+        activeIndex = ([i for i in range(len(toCreate)) if toCreate[i][4]] + [0])[0]
+        lazy = settings.get_value(r'lazy-session-tabs').get_boolean()
+        for i in range(len(toCreate)):
+            toOpen, encoding, line, column, active = toCreate[i]
+            if (lazy and (abs(i - activeIndex) > _eagerSessionNeighbours) and
+                (not toOpen.startswith(r'unsaved://'))):
+                self._createPlaceholderTab(toOpen, encoding, line, column)
+            else:
+                self._createTab(toOpen, encoding, line, column, active)
         self._lastSessionResuming = nowTime()
         self._resumingSession = False
+        activeTab = self.window.get_active_tab()
+        if ((activeTab is not None) and hasattr(activeTab.get_document(), r'metageditPlaceholder')):
+            GLib.idle_add(self._loadPlaceholderTab, activeTab)
+        if (len(missing) > 0): self._reportMissingSessionFiles(sorted(missing))
+        self._sessionChanged()
+
+    def _reportMissingSessionFiles( self, missing ):
+        ## SESSIONS
+        # in a single infobar, over the active tab (replacing the previous one, if still there)
+        self._dismissMissingFilesBar()
+        tab = self.window.get_active_tab()
+        if (tab is None): return
+        paths = [Gio.File.new_for_uri(uri).get_parse_name() for uri in missing]
+        message = str(len(paths)) + (r' files' if (len(paths) > 1) else r' file')
+        message += r' of the session could not be found or reached:' + '\n'
+        message += '\n'.join(paths[:_missingFilesListed])
+        if (len(paths) > _missingFilesListed):
+            message += '\n' + r'(and ' + str(len(paths) - _missingFilesListed) + r' more)'
+        bar = Gtk.InfoBar(message_type=Gtk.MessageType.WARNING, show_close_button=True)
+        label = Gtk.Label(label=message, xalign=0, selectable=True)
+        label.set_tooltip_text('\n'.join(paths))
+        bar.get_content_area().add(label)
+        bar.connect(r'response', lambda b, r: self._dismissMissingFilesBar())
+        bar.connect(r'destroy', self._dismissMissingFilesBar) # along with its tab
+        tab.pack_start(bar, False, True, 0)
+        tab.reorder_child(bar, 0)
+        bar.show_all()
+        self._missingFilesBar = bar
+
+    def _dismissMissingFilesBar( self, bar=None ):
+        ## SESSIONS
+        if ((bar is not None) and (bar is not self._missingFilesBar)): return
+        bar, self._missingFilesBar = self._missingFilesBar, None
+        if (bar is not None): bar.destroy()
 
     def removeSession( self, sessionName ):
         ## SESSIONS
@@ -273,6 +529,7 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         if (os.path.isfile(sessionPath)):
             try: os.remove(sessionPath)
             except: return
+        sessionIndex.remove(sessionName)
         self.window.remove_action(r'load-session-' + sessionName.replace(r' ', r'_'))
         self.window.get_application().metageditActivatable.updateMenuSessions()
 
@@ -292,6 +549,7 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         tab = self.window.get_active_tab()
         tab.get_document().set_language(None)
 
+    @_timed
     def do_activate( self ):
         self.window.metageditActivatable = self
         self.handlers = set()
@@ -303,21 +561,18 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         self.handlers.add(self.window.connect(r'tab-removed', self._onTabRemoved))
         self.handlers.add(self.window.connect(r'tabs-reordered', self._onTabsReordered))
         ## ENCODING STUFF
-        self.window.encodingDialog = EncodingDialog(self.window)
-        self.window.percentEncodeDialog = PercentEncodeDialog(self.window)
         self._encodingStatusLabel = Gtk.Label(label='\U00002014')
         self.window.get_statusbar().pack_end(self._encodingStatusLabel, False, False, 12)
         self._updateEncodingStatus(self.window.get_active_document())
         encodingAction = Gio.SimpleAction(name=r'encoding-dialog')
-        encodingAction.connect(r'activate', lambda a, p: showDialog(self.window.encodingDialog))
+        encodingAction.connect(r'activate', lambda a, p: showDialog(self.window, EncodingDialog))
         self.window.add_action(encodingAction)
         ## LINE OPERATIONS
-        self.window.sortDialog = SortDialog(self.window)
         removeLineAction = Gio.SimpleAction(name=r'remove-line')
         removeLineAction.connect(r'activate', lambda a, p: removeLines(self.window.get_active_document()))
         self.window.add_action(removeLineAction)
         sortAction = Gio.SimpleAction(name=r'sort-dialog')
-        sortAction.connect(r'activate', lambda a, p: showDialog(self.window.sortDialog))
+        sortAction.connect(r'activate', lambda a, p: showDialog(self.window, SortDialog))
         self.window.add_action(sortAction)
         shuffleAction = Gio.SimpleAction(name=r'shuffle')
         shuffleAction.connect(r'activate', lambda a, p: shuffleLines(self.window.get_active_document()))
@@ -335,7 +590,11 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         openAsAdminAction.connect(r'activate', self._openAsAdmin)
         self.window.add_action(openAsAdminAction)
         ## SESSIONS
-        self._lastSessionAutosave = 0
+        self._sessionIsDirty = False
+        self._autosaveSource = None
+        self._sessionValidation = None
+        self._missingFilesBar = None
+        self._lastSavedSession = None
         self._lastSessionResuming = 0
         self._resumingSession = False
         self._quitting = False
@@ -344,46 +603,62 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
             try: os.makedirs(sessionsFolder)
             except: pass
         else:
-            for session in os.listdir(sessionsFolder): self.registerSession(session)
+            for session in sessionIndex.sessions(): self.registerSession(session)
         saveSessionAction = Gio.SimpleAction(name=r'save-session-auto')
         saveSessionAction.connect(r'activate', lambda a, p: self.saveSession())
         self.window.add_action(saveSessionAction)
-        self.window.saveSessionDialog = SaveSessionDialog(self.window, sessionsFolder)
         saveSessionDialogAction = Gio.SimpleAction(name=r'save-session-dialog')
-        saveSessionDialogAction.connect(r'activate', lambda a, p: showDialog(self.window.saveSessionDialog))
+        saveSessionDialogAction.connect(r'activate', lambda a, p: showDialog(self.window, SaveSessionDialog, sessionsFolder))
         self.window.add_action(saveSessionDialogAction)
-        self.window.manageSessionsDialog = ManageSessionsDialog(self.window, sessionsFolder)
         manageSessionsDialogAction = Gio.SimpleAction(name=r'manage-sessions-dialog')
-        manageSessionsDialogAction.connect(r'activate', lambda a, p: showDialog(self.window.manageSessionsDialog))
+        manageSessionsDialogAction.connect(r'activate', lambda a, p: showDialog(self.window, ManageSessionsDialog, sessionsFolder))
         self.window.add_action(manageSessionsDialogAction)
         ## RESTORE UNSAVED DOCUMENTS
         if (not os.path.isdir(unsavedsFolder)):
             try: os.makedirs(unsavedsFolder)
             except: pass
         ## DOCUMENT STATS
-        self.window.documentStatsDialog = DocumentStatsDialog(self.window)
         documentStatsDialogAction = Gio.SimpleAction(name=r'document-stats-dialog')
-        documentStatsDialogAction.connect(r'activate', lambda a, p: showDialog(self.window.documentStatsDialog))
+        documentStatsDialogAction.connect(r'activate', lambda a, p: showDialog(self.window, DocumentStatsDialog))
         self.window.add_action(documentStatsDialogAction)
         ## PICK COLOR
-        self.window.pickColorDialog = PickColorDialog(self.window)
         pickColorDialogAction = Gio.SimpleAction(name=r'pick-color-dialog')
-        pickColorDialogAction.connect(r'activate', lambda a, p: showDialog(self.window.pickColorDialog))
+        pickColorDialogAction.connect(r'activate', lambda a, p: showDialog(self.window, PickColorDialog))
         self.window.add_action(pickColorDialogAction)
-        ## TRANSLATE
-        if (translationIsAvailable):
-            self.window.translationLanguagesDialog = TranslationLanguagesDialog(self.window)
 
     def do_deactivate( self ):
         delattr(self.window, r'metageditActivatable')
         for handler in self.handlers: self.window.disconnect(handler)
+        dropDialogs(self.window)
+        ## SESSIONS
+        self._cancelSessionValidation()
+        self._dismissMissingFilesBar()
+        for document in self.window.get_documents():
+            if (hasattr(document, r'metageditPlaceholderHandler')):
+                document.disconnect(document.metageditPlaceholderHandler)
+                delattr(document, r'metageditPlaceholderHandler')
+        ## LINE OPERATIONS
+        for document in self.window.get_documents(): cancelApplying(document)
+        ## REMOVE TRAILING SPACES
+        for document in self.window.get_documents():
+            if (hasattr(document, r'metageditDirtyLines')):
+                document.metageditDirtyLines.disconnect(document)
+                delattr(document, r'metageditDirtyLines')
+        ## RESTORE UNSAVED DOCUMENTS
+        for document in self.window.get_documents():
+            if (hasattr(document, r'metageditJournal')):
+                document.metageditJournal.flush()
+                document.metageditJournal.disconnect(document)
+                delattr(document, r'metageditJournal')
         ## ENCODING STUFF
-        del self.window.encodingDialog
-        del self.window.percentEncodeDialog
+        for document in self.window.get_documents():
+            if (hasattr(document, r'metageditIdentityHandlers')):
+                for handler in document.metageditIdentityHandlers: document.disconnect(handler)
+                delattr(document, r'metageditIdentityHandlers')
+        encodingCache.flush()
         Gtk.Container.remove(self.window.get_statusbar(), self._encodingStatusLabel)
         del self._encodingStatusLabel
         ## LINE OPERATIONS
-        del self.window.sortDialog
         self.window.remove_action(r'encoding-dialog')
         self.window.remove_action(r'remove-line')
         self.window.remove_action(r'sort-dialog')
@@ -394,22 +669,16 @@ class MetageditWindowActivatable(GObject.Object, Gedit.WindowActivatable):
         ## OPEN AS ADMIN
         self.window.remove_action(r'open-as-admin')
         ## SESSIONS
-        del self.window.saveSessionDialog
-        del self.window.manageSessionsDialog
+        self._cancelSessionFlush()
         self.window.remove_action(r'save-session-auto')
         self.window.remove_action(r'save-session-dialog')
         self.window.remove_action(r'manage-sessions-dialog')
         for sessionAction in self._sessionsActions:
             self.window.remove_action(sessionAction)
         ## DOCUMENT STATS
-        del self.window.documentStatsDialog
         self.window.remove_action(r'document-stats-dialog')
         ## PICK COLOR
-        del self.window.pickColorDialog
         self.window.remove_action(r'pick-color-dialog')
-        ## TRANSLATE
-        if (translationIsAvailable):
-            del self.window.translationLanguagesDialog
 
     def do_update_state( self ):
         pass
@@ -439,10 +708,10 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
             chooseLanguagesItem = Gtk.MenuItem.new_with_mnemonic("Choose Languages...")
             chooseLanguagesItem.show()
             chooseLanguagesItem.connect(
-                    r'activate', lambda i: showDialog(self.window.translationLanguagesDialog))
+                    r'activate', lambda i: showDialog(self.window, TranslationLanguagesDialog))
             translationOptionsSubmenu.append(chooseLanguagesItem)
             self._addSeparatorToMenu(translationOptionsSubmenu, True)
-            for code, language in self.window.translationLanguagesDialog.languages.items():
+            for code, language in windowDialog(self.window, TranslationLanguagesDialog).languages.items():
                 translateToLanguageItem = Gtk.MenuItem.new_with_mnemonic("to " + language)
                 translateToLanguageItem.show()
                 translateToLanguageItem.code = code
@@ -460,7 +729,7 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         encodingOptionsSubmenu = Gtk.Menu()
         encodingItem = Gtk.MenuItem.new_with_mnemonic("Manually Set Encoding...")
         encodingItem.show()
-        encodingItem.connect(r'activate', lambda i: showDialog(self.window.encodingDialog))
+        encodingItem.connect(r'activate', lambda i: showDialog(self.window, EncodingDialog))
         encodingOptionsSubmenu.append(encodingItem)
         fixEncodingItem = Gtk.MenuItem.new_with_mnemonic("Redetect Encoding")
         fixEncodingItem.show()
@@ -473,12 +742,21 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         encodingOptionsSubmenu.append(self.percentEncodeItem)
         self.percentEncodeDialogItem = Gtk.MenuItem.new_with_mnemonic("Percent-Encode with Exceptions...")
         self.percentEncodeDialogItem.show()
-        self.percentEncodeDialogItem.connect(r'activate', lambda i: showDialog(self.window.percentEncodeDialog))
+        self.percentEncodeDialogItem.connect(r'activate', lambda i: showDialog(self.window, PercentEncodeDialog))
         encodingOptionsSubmenu.append(self.percentEncodeDialogItem)
         self.percentDecodeItem = Gtk.MenuItem.new_with_mnemonic("Percent-Decode")
         self.percentDecodeItem.show()
         self.percentDecodeItem.connect(r'activate', lambda i: percentDecode(self.view.get_buffer()))
         encodingOptionsSubmenu.append(self.percentDecodeItem)
+        self._addSeparatorToMenu(encodingOptionsSubmenu, True)
+        htmlEncodeItem = Gtk.MenuItem.new_with_mnemonic("HTML-Encode")
+        htmlEncodeItem.show()
+        htmlEncodeItem.connect(r'activate', lambda i: htmlEncode(self.view.get_buffer()))
+        encodingOptionsSubmenu.append(htmlEncodeItem)
+        htmlDecodeItem = Gtk.MenuItem.new_with_mnemonic("HTML-Decode")
+        htmlDecodeItem.show()
+        htmlDecodeItem.connect(r'activate', lambda i: htmlDecode(self.view.get_buffer()))
+        encodingOptionsSubmenu.append(htmlDecodeItem)
         encodingOptions.set_submenu(encodingOptionsSubmenu)
 
     def _addLineOperationsToContextMenu( self, menu ):
@@ -500,7 +778,7 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         self._addSeparatorToMenu(sortOptionsSubmenu, True)
         sortDialogItem = Gtk.MenuItem.new_with_mnemonic("Advanced Sort...")
         sortDialogItem.show()
-        sortDialogItem.connect(r'activate', lambda i: showDialog(self.window.sortDialog))
+        sortDialogItem.connect(r'activate', lambda i: showDialog(self.window, SortDialog))
         sortOptionsSubmenu.append(sortDialogItem)
         self._addSeparatorToMenu(sortOptionsSubmenu, True)
         joinItem = Gtk.MenuItem.new_with_mnemonic("Join")
@@ -542,7 +820,7 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         hasSelection = self.view.get_buffer().get_has_selection()
         self._addSeparatorToMenu(menu)
         ## TRANSLATE
-        if (translationIsAvailable):
+        if (translationIsAvailable and translationWorks()):
             self._addTranslationToContextMenu(menu)
             self._addSeparatorToMenu(menu)
         ## LINE OPERATIONS
@@ -561,6 +839,7 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         formattingOptionsSubmenu.append(removeTrailingSpacesItem)
         formattingOptions.set_submenu(formattingOptionsSubmenu)
 
+    @_timed
     def do_activate( self ):
         self.window = self.view.get_toplevel()
         self.view.metageditActivatable = self
@@ -592,6 +871,7 @@ class MetageditViewActivatable(GObject.Object, Gedit.ViewActivatable):
         ## COMMENT/UNCOMMENT
         if (hasattr(self.view.get_buffer(), r'lineCommentStyle')):
             delattr(self.view.get_buffer(), r'lineCommentStyle')
+        dropCommentCodec(self.view.get_buffer())
         ## OVERLAY SCROLLBAR SWITCH
         self.view.get_parent().set_overlay_scrolling(self._originalScrollbarSettings)
 
@@ -653,9 +933,8 @@ class MetageditAppActivatable(GObject.Object, Gedit.AppActivatable):
         if (self.loadSessionsSection.get_n_items() > 0): self.loadSessionsSection.remove_all()
         sessions = []
         if (os.path.isdir(sessionsFolder)):
-            for session in os.listdir(sessionsFolder):
-                if (session.startswith(r'.')): continue
-                sessions.append((int(os.path.getmtime(sessionsFolder + session)), session))
+            for session, (tabs, mtime, active) in sessionIndex.sessions().items():
+                sessions.append((int(mtime), session))
             for session in reversed(sorted(sessions)):
                 action = r'win.load-session-' + session[1].replace(r' ', r'_')
                 label = session[1]
@@ -666,6 +945,7 @@ class MetageditAppActivatable(GObject.Object, Gedit.AppActivatable):
         self.loadSessionsSection.remove_all()
         self._populateLoadSessionsSection()
 
+    @_timed
     def do_activate( self ):
         self.app.metageditActivatable = self
         self._fileMenu = self.extend_menu(r'file-section')
@@ -754,9 +1034,12 @@ class MetageditAppActivatable(GObject.Object, Gedit.AppActivatable):
         ## PICK COLOR
         pickColorDialogItem = Gio.MenuItem.new("Pick Color...", r'win.pick-color-dialog')
         self._toolsMenu.append_menu_item(pickColorDialogItem)
+        ## TRANSLATE
+        if (translationIsAvailable): GLib.idle_add(warmTranslation)
 
     def do_deactivate( self ):
         delattr(self.app, r'metageditActivatable')
+        dropAppDialogs()
         del self._fileMenu
         del self._file2Menu
         del self._editMenu
@@ -0,0 +1,203 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+
+from time import monotonic
+import gi
+gi.require_version(r'Gedit', r'3.0')
+gi.require_version(r'Gtk', r'3.0')
+from gi.repository import GLib, Gtk, Gedit
+
+
+
+## LINE OPERATIONS
+
+chunkedApplicationThreshold = 4 * 1024 * 1024 # characters
+_pieceLength = 65536 # characters
+_stepDuration = 0.015 # seconds, per main loop iteration
+_pendingRetryDelay = 50 # milliseconds
+pending = object() # what 'pieces' may yield when its next piece isn't ready yet
+
+
+
+def _textPieces( text, pieceLength=_pieceLength ):
+    for i in range(0, len(text), pieceLength): yield text[i:(i + pieceLength)]
+
+def _linePieces( lines, pieceLength=_pieceLength ):
+    # same as '\n'.join(lines), a piece at a time
+    piece, pieceSize, separator = [], 0, r''
+    for line in lines:
+        piece.append(line)
+        pieceSize += len(line) + 1
+        if (pieceSize >= pieceLength):
+            yield separator + '\n'.join(piece)
+            piece, pieceSize, separator = [], 0, '\n'
+    if (len(piece) > 0): yield separator + '\n'.join(piece)
+
+
+
+class BufferApplier:
+    # replaces [beg, end) with 'pieces' a few at a time from the main loop, all as one
+    # user action, while a progress bar (with a cancel button that rolls everything
+    # back) is shown in the window's status bar; 'done' gets whether it was applied; while
+    # 'pieces' yields 'pending', it's asked again a bit later
+
+    def __init__( self, document, beg, end, pieces, total=None, done=None ):
+        self.document = document
+        self._pieces, self._total, self._applied, self._done = (pieces, total, 0, done)
+        document.metageditApplier = self
+        document.begin_user_action()
+        document.delete(beg, end)
+        self._position = document.create_mark(None, beg, False)
+        self._view, self._progress = (None, None)
+        tab = Gedit.Tab.get_from_document(document)
+        if (tab is not None):
+            self._view = tab.get_view()
+            self._wasEditable = self._view.get_editable()
+            self._view.set_editable(False)
+            self._showProgress(tab.get_toplevel())
+        self._source = GLib.idle_add(self._step)
+
+    def _showProgress( self, window ):
+        if (not isinstance(window, Gedit.Window)): return
+        self._progress = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self._progressBar = Gtk.ProgressBar(show_text=True, valign=Gtk.Align.CENTER)
+        self._progress.pack_start(self._progressBar, False, False, 0)
+        cancelButton = Gtk.Button(label=r'Cancel', relief=Gtk.ReliefStyle.NONE)
+        cancelButton.connect(r'clicked', lambda b: self.cancel())
+        self._progress.pack_start(cancelButton, False, False, 0)
+        window.get_statusbar().pack_end(self._progress, False, False, 12)
+        self._progress.show_all()
+
+    def _step( self ):
+        deadline = monotonic() + _stepDuration
+        failed = False
+        try:
+            while True: # at least one piece per step
+                piece = next(self._pieces, None)
+                if (piece is None): break
+                if (piece is pending):
+                    self._source = GLib.timeout_add(_pendingRetryDelay, self._resume)
+                    self._updateProgress()
+                    return False
+                self.document.insert(self.document.get_iter_at_mark(self._position), piece)
+                self._applied += len(piece)
+                if (monotonic() >= deadline): return self._updateProgress()
+        except:
+            failed = True
+        self._finish(failed)
+        return False
+
+    def _resume( self ):
+        self._source = GLib.idle_add(self._step)
+        return False
+
+    def _updateProgress( self ):
+        if (self._progress is not None):
+            if (self._total):
+                self._progressBar.set_fraction(min(1, (self._applied / self._total)))
+            else:
+                self._progressBar.pulse()
+        return True
+
+    def cancel( self ):
+        if (self._source is None): return
+        GLib.source_remove(self._source)
+        self._finish(True)
+
+    def finish( self ):
+        # applies all that's left right away (rolling everything back instead if some of it
+        # isn't ready yet)
+        if (self._source is None): return
+        GLib.source_remove(self._source)
+        failed = False
+        try:
+            for piece in self._pieces:
+                if (piece is pending):
+                    failed = True
+                    break
+                self.document.insert(self.document.get_iter_at_mark(self._position), piece)
+        except:
+            failed = True
+        self._finish(failed)
+
+    def _finish( self, cancelled ):
+        self._source = None
+        document = self.document
+        document.end_user_action()
+        if (cancelled):
+            if (document.can_undo()): document.undo()
+        else:
+            document.place_cursor(document.get_iter_at_mark(self._position))
+        document.delete_mark(self._position)
+        if (self._view is not None): self._view.set_editable(self._wasEditable)
+        if (self._progress is not None): self._progress.destroy()
+        delattr(document, r'metageditApplier')
+        if (self._done is not None): self._done(not cancelled)
+
+def isBeingApplied( document ):
+    return hasattr(document, r'metageditApplier')
+
+def cancelApplying( document ):
+    if (isBeingApplied(document)): document.metageditApplier.cancel()
+
+def finishApplying( document ):
+    if (isBeingApplied(document)): document.metageditApplier.finish()
+
+def applyText( document, beg, end, text, done=None ):
+    # replaces [beg, end) with 'text', right away if it's small enough
+    if (isBeingApplied(document)):
+        if (done is not None): done(False)
+        return
+    if (len(text) > chunkedApplicationThreshold):
+        BufferApplier(document, beg, end, _textPieces(text), len(text), done)
+        return
+    document.begin_user_action()
+    try:
+        document.delete(beg, end)
+        document.insert(beg, text)
+    except:
+        document.end_user_action()
+        if (document.can_undo()): document.undo()
+        if (done is not None): done(False)
+        return
+    document.end_user_action()
+    if (done is not None): done(True)
+
+def applyPieces( document, beg, end, pieces, done=None ):
+    # same as applyText(document, beg, end, ''.join(pieces), done), without the big join
+    total = sum(map(len, pieces))
+    if (total <= chunkedApplicationThreshold):
+        applyText(document, beg, end, r''.join(pieces), done)
+    elif (isBeingApplied(document)):
+        if (done is not None): done(False)
+    else:
+        BufferApplier(document, beg, end, iter(pieces), total, done)
+
+def applyLines( document, beg, end, lines, done=None ):
+    # same as applyText(document, beg, end, '\n'.join(lines), done), without the big join
+    if (isBeingApplied(document)):
+        if (done is not None): done(False)
+        return
+    if (isinstance(lines, list)):
+        total = sum(map(len, lines)) + len(lines)
+        if (total <= chunkedApplicationThreshold):
+            applyText(document, beg, end, '\n'.join(lines), done)
+            return
+    else:
+        total = None
+    BufferApplier(document, beg, end, _linePieces(lines), total, done)
@@ -298,3 +298,48 @@ commentSymbol = {
                   _l_Mathematica:_pascalComment, _l_Smarty:(r'{*', r'*}'), _l_Nim:(r'#[', r']#'),
                   _l_AppleScript:_pascalComment, _l_Clojure:(r'(comment', r')'),
                   _l_Simula:(r'comment', r';')}} #TODO: simula case
+
+class CommentCodec:
+    # a language's comment symbols, along with the regexes that find them, compiled once
+
+    def __init__( self, language ):
+        self.language = language
+        self.lineStart, self.hashAlternative, self.block, self.limits = (None, False, None, None)
+        self.commented, self.startOfComment = (None, None)
+        if (language in commentSymbol[r'line']):
+            self.lineStart = commentSymbol[r'line'][language]
+            self.hashAlternative = language in commentSymbol[r'line#']
+            self.limits = (self.lineStart, r'')
+            start = r'(' + re.escape(self.lineStart) + r'+' + (r'|#+' if self.hashAlternative else r'') + r')'
+            self.commented = re.compile(r'^\s*' + start)
+        elif (len(commentSymbol[r'block'].get(language, ())) == 2): # reST's is a placeholder
+            self.block = self.limits = commentSymbol[r'block'][language]
+            start = r'(' + re.escape(self.block[0]) + r')'
+            self.commented = re.compile(r'^\s*' + start + r'.*' + re.escape(self.block[1][0]))
+        if (self.commented is not None): self.startOfComment = re.compile(start + r'\s*')
+        self.special = ((self.limits is None) and (language in commentSymbol[r'special']))
+        self.isUseless = ((self.limits is None) and (not self.special))
+
+_commentCodecs = {}
+
+def _forgetCommentCodec( document, parameter=None ):
+    document.metageditCommentCodec = None
+
+def commentCodec( document ):
+    # cached on the document until its language changes
+    codec = getattr(document, r'metageditCommentCodec', None)
+    if (codec is None):
+        language = document.get_language()
+        if (language is not None): language = cleanLanguageName(language.get_name())
+        if (language not in _commentCodecs): _commentCodecs[language] = CommentCodec(language)
+        codec = document.metageditCommentCodec = _commentCodecs[language]
+        if (not hasattr(document, r'metageditCommentCodecHandler')):
+            document.metageditCommentCodecHandler = document.connect(r'notify::language',
+                                                                     _forgetCommentCodec)
+    return codec
+
+def dropCommentCodec( document ):
+    if (hasattr(document, r'metageditCommentCodecHandler')):
+        document.disconnect(document.metageditCommentCodecHandler)
+        delattr(document, r'metageditCommentCodecHandler')
+    if (hasattr(document, r'metageditCommentCodec')): delattr(document, r'metageditCommentCodec')
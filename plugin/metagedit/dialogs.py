@@ -18,23 +18,63 @@
 
 import re
 from time import localtime, strftime
-from os import listdir, stat, rename
-import iso639
-from gi.repository import GObject, Gtk, Gedit
+from os import listdir, rename
+from concurrent.futures import ThreadPoolExecutor
+from gi.repository import GLib, GObject, Gtk, Gedit
 
 from .textManipulation import *
 from .encodingsAndLanguages import *
-
-
-
-def showDialog( dialog ):
+from .storage import SessionIndex
+
+
+
+_appDialogs = dict() # dialogClass: dialog, for the ones shared by all windows
+
+def windowDialog( geditWindow, dialogClass, *arguments ):
+    # the instance of 'dialogClass' for 'geditWindow', created on first use (the ones shared
+    # by all windows stay with the window they were last shown from)
+    if (dialogClass.appLevel):
+        dialog = _appDialogs.get(dialogClass)
+        if (dialog is None):
+            dialog = _appDialogs[dialogClass] = dialogClass(geditWindow, *arguments)
+        elif (dialog.window is None):
+            dialog.attach(geditWindow)
+        return dialog
+    if (not hasattr(geditWindow, r'metageditDialogs')): geditWindow.metageditDialogs = dict()
+    dialog = geditWindow.metageditDialogs.get(dialogClass)
+    if (dialog is None):
+        dialog = geditWindow.metageditDialogs[dialogClass] = dialogClass(geditWindow, *arguments)
+    return dialog
+
+def showDialog( geditWindow, dialogClass, *arguments ):
+    dialog = windowDialog(geditWindow, dialogClass, *arguments)
+    if (dialog.window is not geditWindow): dialog.attach(geditWindow)
     if (dialog.window is None): return
     if (not dialog.get_visible()): dialog.show_all()
     else: dialog.present()
 
+def dropDialogs( geditWindow ):
+    # destroys the dialogs created for 'geditWindow', and detaches the shared ones from it
+    for dialog in getattr(geditWindow, r'metageditDialogs', dict()).values():
+        dialog._onDestroy()
+        dialog.destroy()
+    if (hasattr(geditWindow, r'metageditDialogs')): delattr(geditWindow, r'metageditDialogs')
+    for dialog in _appDialogs.values():
+        if (dialog.window is geditWindow): dialog.attach(None)
+
+def dropAppDialogs():
+    for dialog in _appDialogs.values():
+        dialog._onDestroy()
+        dialog.destroy()
+    _appDialogs.clear()
+
 
 
 class MetageditDialog(Gtk.Window):
+    # whether one instance is shared by all windows, moved to the one it's shown from (not for
+    # the ones following their window's active tab while shown, like EncodingDialog and
+    # DocumentStatsDialog, as each window may have its own open at once)
+    appLevel = False
 
     def __init__( self, geditWindow, title ):
         Gtk.Window.__init__(self, title=title, transient_for=geditWindow, resizable=False)
@@ -44,6 +84,12 @@ class MetageditDialog(Gtk.Window):
         self._content.set_border_width(10)
         self.add(self._content)
 
+    def attach( self, geditWindow ):
+        # for the dialogs shared by all windows
+        self.hide()
+        self.window = geditWindow
+        self.set_transient_for(geditWindow)
+
     def pack( self, widget, expand, fill, padding ):
         self._content.pack_start(widget, expand, fill, padding)
 
@@ -56,17 +102,13 @@ class MetageditDialog(Gtk.Window):
 ## ENCODING STUFF
 
 class EncodingDialog(MetageditDialog):
+    _languages = None
 
     def __init__( self, geditWindow ):
         MetageditDialog.__init__(self, geditWindow, r'Set Character Encoding')
-        self.previewing = False
-        languageStore = Gtk.ListStore(str, str)
-        seenLanguages = set()
-        for language in iso639.languages.name.values():
-            if ((len(language.part2b) == 3) and (language.part2b not in seenLanguages)):
-                languageStore.append([language.part2b, language.name])
-                seenLanguages.add(language.part2b)
-        languageFilterEntry = Gtk.ComboBox.new_with_model_and_entry(languageStore)
+        self._previewer = None # (a thread, while shown)
+        self._previewGeneration = 0
+        languageFilterEntry = Gtk.ComboBox.new_with_model_and_entry(self._languageStore())
         languageFilterEntry.connect(r'changed', self._onLanguageChanged)
         languageFilterEntry.set_entry_text_column(1)
         languageFilterEntry.set_tooltip_text(r'Filter possible encodings by language')
@@ -77,39 +119,70 @@ class EncodingDialog(MetageditDialog):
         actualCurrentEncoding.pack_start(actualCurrentEncodingLabel, False, True, 10)
         self.actualCurrentEncodingEntry = Gtk.ComboBox()
         self._setEncodingCombo()
-        self.actualCurrentEncodingEntry.connect(r'changed', self._onEncodingChanged)
+        self._encodingChangedHandler = self.actualCurrentEncodingEntry.connect(r'changed', self._onEncodingChanged)
         actualCurrentEncodingText = Gtk.CellRendererText()
         self.actualCurrentEncodingEntry.pack_start(actualCurrentEncodingText, True)
         self.actualCurrentEncodingEntry.add_attribute(actualCurrentEncodingText, r'text', 0)
         self.actualCurrentEncodingEntry.set_active(0)
         actualCurrentEncoding.pack_start(self.actualCurrentEncodingEntry, True, True, 0)
+        self.rankButton = Gtk.Button(label=r'Rank Candidates')
+        self.rankButton.set_tooltip_text(r'Sort the encodings below by how well they decode the document')
+        self.rankButton.connect(r'clicked', self._rankEncodings)
+        actualCurrentEncoding.pack_start(self.rankButton, False, True, 4)
         self.pack(actualCurrentEncoding, True, False, 0)
+        self.detectionLabel = Gtk.Label(label=r'')
+        self.pack(self.detectionLabel, True, False, 0)
+        preview = Gtk.ScrolledWindow()
+        preview.set_size_request(560, 240)
+        self.previewView = Gtk.TextView(editable=False, cursor_visible=False, monospace=True)
+        preview.add(self.previewView)
+        self.pack(preview, True, True, 0)
         self.setEncodingButton = Gtk.Button(label=r'Looks Good')
         self.setEncodingButton.connect(r'clicked', self._setEncoding)
         self.pack(self.setEncodingButton, True, True, 0)
-        ASCIIButton = Gtk.Button(label=r'Agressively Convert to ASCII')
+        ASCIIButton = Gtk.Button(label=r'Aggressively Convert to ASCII')
+        ASCIIButton.set_tooltip_text(r'Also replace accented letters, ligatures, typographic '
+                                     r'quotes, Cyrillic, Greek, etc. with ASCII look-alikes')
         ASCIIButton.connect(r'clicked', self._toASCIIForced)
         self.pack(ASCIIButton, True, True, 0)
-        ASCIIButton.set_sensitive(False) #TODO: This functionality needs to be improved
         self.connect(r'show', self._onShow)
         self.connect(r'delete-event', self._onDestroy)
         self.setEncodingButton.grab_focus()
 
+    @classmethod
+    def _languageStore( cls ):
+        # filled once, then shared by the dialogs of all windows
+        if (cls._languages is None):
+            import iso639
+            cls._languages = Gtk.ListStore(str, str)
+            seenLanguages = set()
+            for language in iso639.languages.name.values():
+                if ((len(language.part2b) == 3) and (language.part2b not in seenLanguages)):
+                    cls._languages.append([language.part2b, language.name])
+                    seenLanguages.add(language.part2b)
+        return cls._languages
+
     def _onShow( self, widget=None, event=None ):
-        self.setEncodingButton.set_sensitive(False)
-        self.previewing = False
+        self.detectionLabel.set_text(r'')
+        # (previewed right below, not by _onEncodingChanged() too)
+        self.actualCurrentEncodingEntry.handler_block(self._encodingChangedHandler)
         self.actualCurrentEncodingEntry.set_active(0)
+        self.actualCurrentEncodingEntry.handler_unblock(self._encodingChangedHandler)
+        self._preview(r'Autodetect')
+        self.setEncodingButton.set_sensitive(True)
 
-    def _setEncodingCombo( self, language=r'mul' ):
+    def _setEncodingCombo( self, language=r'mul', encodings=None ):
+        self._language = language
+        self._rankGeneration = getattr(self, r'_rankGeneration', 0) + 1
         encodingStore = Gtk.ListStore(str)
         encodingStore.append([r'Autodetect'])
         seenEncodings = set()
-        for encoding in supportedEncodings(language):
+        if (encodings is None): encodings = supportedEncodings(language)
+        for encoding in encodings:
             encodingNormalized = encoding.casefold().strip()
             if (encodingNormalized not in seenEncodings):
                 encodingStore.append([encoding])
                 seenEncodings.add(encodingNormalized)
-        if (self.previewing): self.window.get_active_document().undo()
         self.actualCurrentEncodingEntry.set_model(encodingStore)
         self.actualCurrentEncodingEntry.set_active(0)
 
@@ -121,6 +194,7 @@ class EncodingDialog(MetageditDialog):
         else:
             language = re.sub(r'\s+', r' ', combo.get_child().get_text().strip().capitalize())
             if (len(language) < 2): return
+            import iso639
             try: iso6392B = iso639.languages.name.get(language).part2b
             except: iso6392B = r'und'
             if (iso6392B in {r'', r'mul', r'und', r'zxx'}): return
@@ -129,31 +203,139 @@ class EncodingDialog(MetageditDialog):
     def _onEncodingChanged( self, combo ):
         i = combo.get_active_iter()
         if (i is not None):
-            encoding = combo.get_model()[i][0]
-            if (self.previewing): self.window.get_active_document().undo()
-            self.previewing = True
-            redecode(self.window.get_active_document(), encoding)
+            self._preview(combo.get_model()[i][0])
             self.setEncodingButton.set_sensitive(True)
 
+    def _rankEncodings( self, button=None ):
+        # candidates get scored by worker processes (see rankEncodings()), then reordered
+        document = self.window.get_active_document()
+        if (document is None): return
+        try: sample = encodingSample(document)
+        except: return
+        encodings = [row[0] for row in self.actualCurrentEncodingEntry.get_model()][1:]
+        self._rankGeneration += 1
+        generation = self._rankGeneration
+        self.rankButton.set_sensitive(False)
+        self.detectionLabel.set_text(r'Ranking %d encodings...' % len(encodings))
+        try:
+            submitEncodingRanking(sample, encodings, self._language,
+                                  lambda ranked: GLib.idle_add(self._showRanking, generation, ranked))
+        except:
+            self._showRanking(generation, None)
+
+    def _showRanking( self, generation, encodings ):
+        self.rankButton.set_sensitive(True)
+        if (generation != self._rankGeneration): return False # outdated
+        if (encodings is None):
+            self.detectionLabel.set_text(r'Could not rank the encodings')
+            return False
+        self._setEncodingCombo(self._language, encodings)
+        self.detectionLabel.set_text(r'Encodings ranked from the best to the worst fit')
+        self.actualCurrentEncodingEntry.set_active(1)
+        return False
+
+    def _previewRange( self, document, marginLines=100, maxCharacters=262144 ):
+        # what's visible in the active view, plus some lines around it
+        view = self.window.get_active_view()
+        visible = view.get_visible_rect()
+        beg = view.get_line_at_y(visible.y)[0]
+        end = view.get_line_at_y(visible.y + visible.height)[0]
+        firstVisibleLine = beg.get_line()
+        beg.backward_lines(marginLines)
+        end.forward_lines(marginLines)
+        if (not end.ends_line()): end.forward_to_line_end()
+        if ((end.get_offset() - beg.get_offset()) > maxCharacters):
+            end = document.get_iter_at_offset(beg.get_offset() + maxCharacters)
+        return (beg, end, (firstVisibleLine - beg.get_line()))
+
+    def _preview( self, encoding ):
+        # only the visible part of the document gets redecoded (by a worker thread, which
+        # also detects the encoding, for 'Autodetect')
+        document = self.window.get_active_document()
+        self._previewGeneration += 1
+        if (document is None): return
+        if (self._previewer is None): self._previewer = ThreadPoolExecutor(max_workers=1)
+        try:
+            inUse = inUseEncoding(document)
+            if (encoding == r'Autodetect'):
+                generation = self._previewGeneration
+                submitEncodingDetection(document, inUse, self._previewer,
+                                        lambda detection: self._previewDetected(generation, document,
+                                                                                inUse, detection))
+                return
+            encoding = codecName(encoding)
+        except:
+            self.previewView.get_buffer().set_text(r'')
+            return
+        self._submitPreview(document, inUse, encoding)
+
+    def _previewDetected( self, generation, document, inUse, detection ):
+        if (generation != self._previewGeneration): return # outdated
+        self._showDetection(document)
+        try: encoding = codecName(detection[0] or inUse)
+        except:
+            self.previewView.get_buffer().set_text(r'')
+            return
+        self._submitPreview(document, inUse, encoding)
+
+    def _submitPreview( self, document, inUse, encoding ):
+        if (self._previewer is None): return
+        beg, end, firstVisibleLine = self._previewRange(document)
+        text = document.get_text(beg, end, False)
+        self._previewer.submit(self._decodePreview, self._previewGeneration, text, inUse, encoding,
+                               firstVisibleLine)
+
+    def _decodePreview( self, generation, text, inUse, encoding, firstVisibleLine ):
+        try: text = redecodedText(text, inUse, encoding)
+        except: text = r''
+        GLib.idle_add(self._showPreview, generation, text, firstVisibleLine)
+
+    def _showPreview( self, generation, text, firstVisibleLine ):
+        if (generation != self._previewGeneration): return False # outdated
+        previewBuffer = self.previewView.get_buffer()
+        previewBuffer.set_text(text)
+        previewBuffer.place_cursor(previewBuffer.get_iter_at_line(firstVisibleLine))
+        self.previewView.scroll_to_mark(previewBuffer.get_insert(), 0, True, 0, 0)
+        return False
+
+    def _showDetection( self, document ):
+        detection = getattr(document, r'metageditEncodingDetection', None)
+        if (detection is None): return
+        encoding, confidence, examined = detection
+        if (examined is None): examined = r'cached, nothing'
+        elif (examined >= 1024): examined = r'%d KiB' % (examined // 1024)
+        else: examined = r'%d bytes' % examined
+        self.detectionLabel.set_text(r'Detected %s with %d%% confidence (%s examined)'
+                                     % ((encoding or r'nothing'), round(confidence * 100), examined))
+
     def _onDestroy( self, widget=None, event=None ):
-        if (self.previewing): self.window.get_active_document().undo()
+        self._previewGeneration += 1
+        if (self._previewer is not None):
+            self._previewer.shutdown(wait=False, cancel_futures=True)
+            self._previewer = None
+        self._rankGeneration += 1
+        self.rankButton.set_sensitive(True)
+        self.previewView.get_buffer().set_text(r'')
         self.hide()
         return True
 
     def _setEncoding( self, widget ):
-        self.hide()
+        i = self.actualCurrentEncodingEntry.get_active_iter()
+        if (i is not None):
+            redecode(self.window.get_active_document(), self.actualCurrentEncodingEntry.get_model()[i][0])
+        self._onDestroy()
 
     def _toASCIIForced( self, widget ):
-        if (self.previewing): self.window.get_active_document().undo()
         i = self.actualCurrentEncodingEntry.get_active_iter()
         if (i is not None):
             encoding = self.actualCurrentEncodingEntry.get_model()[i][0]
             redecode(self.window.get_active_document(), encoding, True)
-        self.hide()
+        self._onDestroy()
 
 
 
 class PercentEncodeDialog(MetageditDialog):
+    appLevel = True
 
     def __init__( self, geditWindow ):
         MetageditDialog.__init__(self, geditWindow, r'Percent-Encoding')
@@ -176,6 +358,7 @@ class PercentEncodeDialog(MetageditDialog):
 ## LINE OPERATIONS
 
 class SortDialog(MetageditDialog):
+    appLevel = True
 
     def __init__( self, geditWindow ):
         MetageditDialog.__init__(self, geditWindow, r'Sort Lines')
@@ -201,6 +384,23 @@ class SortDialog(MetageditDialog):
         self._sortOffsetEntry.set_range(0, 999)
         sortOffset.pack_start(self._sortOffsetEntry, True, True, 0)
         self.pack(sortOffset, True, False, 0)
+        sortMode = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+        sortModeLabel = Gtk.Label(label=r'Compare lines as:')
+        sortMode.pack_start(sortModeLabel, False, True, 10)
+        self._sortModeEntry = Gtk.ComboBoxText()
+        for mode in sortModes: self._sortModeEntry.append_text(mode)
+        self._sortModeEntry.set_active(0)
+        sortMode.pack_start(self._sortModeEntry, True, True, 0)
+        self.pack(sortMode, True, False, 0)
+        sortColumns = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        self._sortColumnsEntry = Gtk.Entry(placeholder_text=r'Key columns (e.g. 2,1)')
+        self._sortColumnsEntry.set_tooltip_text(r'Columns to sort by, in order of priority')
+        sortColumns.pack_start(self._sortColumnsEntry, True, True, 0)
+        self._sortDelimiterEntry = Gtk.Entry(placeholder_text=r'Delimiter', text=r',')
+        self._sortDelimiterEntry.set_tooltip_text(r'Column delimiter (\t for tabs)')
+        self._sortDelimiterEntry.set_width_chars(9)
+        sortColumns.pack_start(self._sortDelimiterEntry, False, True, 0)
+        self.pack(sortColumns, True, False, 0)
         sortButton = Gtk.Button(label=r'Sort')
         sortButton.connect(r'clicked', self._sort)
         self.pack(sortButton, True, True, 0)
@@ -224,11 +424,17 @@ class SortDialog(MetageditDialog):
     def _getOffset( self ):
         return self._sortOffsetEntry.get_value_as_int()
 
+    def _getColumns( self ):
+        columns = re.findall(r'[0-9]+', self._sortColumnsEntry.get_text())
+        return tuple([int(column) for column in columns if (int(column) > 0)])
+
+    def _getDelimiter( self ):
+        delimiter = self._sortDelimiterEntry.get_text().replace(r'\t', '\t')
+        return delimiter if (len(delimiter) > 0) else None
+
     def _dedup( self, widget ):
-        self.window.get_active_document().begin_user_action()
-        dedupLines(self.window.get_active_document(), self.case, self._getOffset())
-        if (self.reverse): reverseLines(self.window.get_active_document())
-        self.window.get_active_document().end_user_action()
+        dedupLines(self.window.get_active_document(), self.case, offset=self._getOffset(),
+                   reverse=self.reverse)
         self.hide()
 
     def _shuffle( self, widget ):
@@ -236,7 +442,9 @@ class SortDialog(MetageditDialog):
         self.hide()
 
     def _sort( self, widget ):
-        sortLines(self.window.get_active_document(), self.reverse, self.dedup, self.case, self._getOffset())
+        sortLines(self.window.get_active_document(), self.reverse, self.dedup, self.case,
+                  self._getOffset(), self._sortModeEntry.get_active_text(),
+                  self._getDelimiter(), self._getColumns())
         self.hide()
 
 
@@ -248,6 +456,7 @@ class SessionDialog(MetageditDialog):
     def __init__( self, geditWindow, title, sessionsFolder ):
         MetageditDialog.__init__(self, geditWindow, title)
         self.sessionsFolder = sessionsFolder
+        self.sessionIndex = SessionIndex(sessionsFolder)
         self.forbiddenCharacters = re.compile(r'[^\w .-]')
         self.sessionNameEntry = Gtk.Entry()
         self.sessionNameEntry.set_max_length(40)
@@ -267,6 +476,7 @@ class SessionDialog(MetageditDialog):
 
 
 class SaveSessionDialog(SessionDialog):
+    appLevel = True
 
     def __init__( self, geditWindow, sessionsFolder ):
         SessionDialog.__init__(self, geditWindow, r'Save Session', sessionsFolder)
@@ -293,6 +503,7 @@ class SaveSessionDialog(SessionDialog):
 
 
 class ManageSessionsDialog(SessionDialog):
+    appLevel = True
 
     def __init__( self, geditWindow, sessionsFolder ):
         SessionDialog.__init__(self, geditWindow, r'Manage Sessions', sessionsFolder)
@@ -303,6 +514,7 @@ class ManageSessionsDialog(SessionDialog):
             column = Gtk.TreeViewColumn(columnTitle, renderer, text=i)
             column.set_expand(columnsExpand[i])
             self.sessionsList.append_column(column)
+        self.sessionsList.set_tooltip_column(3) # the active file
         scrolled = Gtk.ScrolledWindow()
         scrolled.set_vexpand(True)
         scrolled.set_min_content_height(200)
@@ -350,13 +562,10 @@ class ManageSessionsDialog(SessionDialog):
         self.renameSession.hide()
 
     def _updateSessionsList( self ):
-        sessionsStore = Gtk.ListStore(str, int, str)
-        for session in listdir(self.sessionsFolder):
-            try: tabs = len(open(self.sessionsFolder + session, r'r').read().splitlines())
-            except: continue
-            mtime = localtime(stat(self.sessionsFolder + session).st_mtime)
-            mtime = strftime(r'%Y-%m-%d %H:%M:%S ', mtime)
-            sessionsStore.append([session, tabs, mtime])
+        sessionsStore = Gtk.ListStore(str, int, str, str)
+        for session, (tabs, mtime, active) in sorted(self.sessionIndex.sessions().items()):
+            mtime = strftime(r'%Y-%m-%d %H:%M:%S ', localtime(mtime))
+            sessionsStore.append([session, tabs, mtime, GLib.markup_escape_text(active)])
         self.sessionsList.set_model(sessionsStore)
 
     def _loadSession( self, widget ):
@@ -375,6 +584,7 @@ class ManageSessionsDialog(SessionDialog):
         session = model.get_value(model.get_iter(paths[0]), 0)
         try: rename(self.sessionsFolder + session, self.sessionsFolder + newName)
         except: return
+        self.sessionIndex.rename(session, newName)
         self.window.metageditActivatable.removeSession(session)
         self.window.metageditActivatable.registerSession(newName)
         self._updateSessionsList()
@@ -399,6 +609,10 @@ class ManageSessionsDialog(SessionDialog):
 
 ## DOCUMENT STATS
 
+def _nonSpaceCount( text ):
+    # str.split() drops the same characters r'\s' matches
+    return sum(map(len, text.split()))
+
 class DocumentStatsDialog(MetageditDialog):
 
     def __init__( self, geditWindow ):
@@ -462,9 +676,9 @@ class DocumentStatsDialog(MetageditDialog):
         while i.forward_visible_word_end(): words += 1
         characters = self.document.get_char_count()
         i = self.document.get_start_iter()
-        charactersNotSpaces = characters
-        end = self.document.get_end_iter()
-        charactersNotSpaces -= len(re.findall(r'\s', self.document.get_text(i, end, False)))
+        charactersNotSpaces = 0
+        for chunk in chunksOf(self.document, i, self.document.get_end_iter()):
+            charactersNotSpaces += _nonSpaceCount(chunk)
         bytes = i.get_bytes_in_line()
         while i.forward_visible_line(): bytes += i.get_bytes_in_line()
         self.lines.set_text(str(lines))
@@ -489,11 +703,14 @@ class DocumentStatsDialog(MetageditDialog):
         lines = 0
         i = self.document.get_selection_bounds()[0]
         while i.in_range(beg, end) and i.forward_visible_line(): lines += 1
-        text = self.document.get_text(beg, end, False)
-        bytes = len(text.encode(r'utf-8', r'ignore'))
+        bytes, characters, charactersNotSpaces = (0, 0, 0)
+        for chunk in chunksOf(self.document, beg, end):
+            bytes += len(chunk.encode(r'utf-8', r'ignore'))
+            characters += len(chunk)
+            charactersNotSpaces += _nonSpaceCount(chunk)
         self.selectedBytes.set_text(str(bytes))
-        self.selectedCharacters.set_text(str(len(text)))
-        self.selectedCharactersNotSpaces.set_text(str(len(text) - len(re.findall(r'\s', text))))
+        self.selectedCharacters.set_text(str(characters))
+        self.selectedCharactersNotSpaces.set_text(str(charactersNotSpaces))
         self.selectedLines.set_text(str(lines))
         self.selectedWords.set_text(str(words))
 
@@ -527,6 +744,7 @@ class DocumentStatsDialog(MetageditDialog):
         if (self.windowHandler is not None): self.window.disconnect(self.windowHandler)
         if (self.documentHandler is not None): self.document.disconnect(self.documentHandler)
         if (self.viewHandler is not None): self.view.disconnect(self.viewHandler)
+        self.windowHandler, self.documentHandler, self.viewHandler = (None, None, None)
         self.hide()
         return True
 
@@ -535,6 +753,7 @@ class DocumentStatsDialog(MetageditDialog):
 ## PICK COLOR
 
 class PickColorDialog(MetageditDialog):
+    appLevel = True
 
     def __init__( self, geditWindow ):
         MetageditDialog.__init__(self, geditWindow, r'Pick Color')
@@ -624,14 +843,15 @@ class PickColorDialog(MetageditDialog):
 if (translationIsAvailable):
 
     class TranslationLanguagesDialog(MetageditDialog):
+        appLevel = True
 
         def __init__( self, geditWindow ):
             MetageditDialog.__init__(self, geditWindow, r'Languages ​​to Translate To')
+            languages = translatableLanguages()
             defaultLanguage = defaultLanguageISO6391()
             self.languages = dict()
-            self.selected = (defaultLanguageISO6391,
-                                translatableLanguages[defaultLanguage].title())
-            if (defaultLanguage in translatableLanguages):
+            self.selected = (defaultLanguage, languages.get(defaultLanguage, r'').title())
+            if (defaultLanguage in languages):
                 self.languages[defaultLanguage] = self.selected[1]
             self.languagesList = Gtk.TreeView()
             column = Gtk.TreeViewColumn(r'🏷', Gtk.CellRendererText(), text=0)
@@ -643,7 +863,7 @@ if (translationIsAvailable):
             column.set_min_width(225)
             self.languagesList.append_column(column)
             languageStore = Gtk.ListStore(str, str)
-            for code, language in translatableLanguages.items():
+            for code, language in languages.items():
                 languageStore.append([code, (r' ' + language.title())])
             self.languagesList.set_model(languageStore)
             self.languagesList.set_activate_on_single_click(True)
@@ -658,6 +878,15 @@ if (translationIsAvailable):
             self.hideShowButton = Gtk.ToggleButton(label=r'Show', active=False)
             self.hideShowButton.connect(r'clicked', self._showHideLanguage)
             self.pack(self.hideShowButton, True, False, 0)
+            self.memoryLabel = Gtk.Label(label=r'')
+            self.pack(self.memoryLabel, True, False, 0)
+            self.connect(r'show', self._showMemoryStatistics)
+
+        def _showMemoryStatistics( self, widget=None ):
+            entries, hits, misses = translationMemory.statistics()
+            hitRate = (r'%d%%' % round(100 * hits / (hits + misses))) if ((hits + misses) > 0) else r'-'
+            self.memoryLabel.set_text(r'Translation memory: %d chunks kept, %s hits (%d of %d)'
+                                      % (entries, hitRate, hits, (hits + misses)))
 
         def _languageSelected( self, view, path, column, data=None ):
             model = view.get_model()
@@ -18,11 +18,13 @@
 
 import re
 from locale import getdefaultlocale as getDefaultLocale
-import iso639
+from unicodedata import normalize as unicodeNormalize, combining as unicodeCombining
+from html.entities import name2codepoint as html2codepoint
 
 
 
 def defaultLanguage():
+    import iso639
     language = iso639.languages.part1.get(getDefaultLocale()[0][:2])
     return re.sub(r',.*$', r'', language.name)
 
@@ -30,6 +32,7 @@ def defaultLanguageISO6391():
     return getDefaultLocale()[0][:2]
 
 def defaultLanguageISO6392B():
+    import iso639
     language = iso639.languages.part1.get(getDefaultLocale()[0][:2])
     return language.part2b
 
@@ -82,3 +85,133 @@ def supportedEncodings( languageISO6392=r'mul' ):
     encodings += reversed(globalEncodings)
     sortKey = lambda x: re.sub(r'[-_\s]+', r'', x).casefold()
     return sorted(encodings, key=sortKey, reverse=True)
+
+
+
+_scriptLetters = {r'Latin':'\u00C0-\u024F\u1E00-\u1EFF', r'Cyrillic':'\u0400-\u052F',
+                  r'Greek':'\u0370-\u03FF\u1F00-\u1FFF', r'Hebrew':'\u0590-\u05FF',
+                  r'Arabic':'\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF',
+                  r'Thai':'\u0E00-\u0E7F', r'Chinese':'\u3400-\u4DBF\u4E00-\u9FFF',
+                  r'Japanese':'\u3040-\u30FF\u3400-\u4DBF\u4E00-\u9FFF\uFF66-\uFF9F',
+                  r'Korean':'\u1100-\u11FF\u3130-\u318F\uAC00-\uD7AF\u4E00-\u9FFF'}
+
+_scriptLanguages = ((r'Cyrillic', ((_cyrillic_ext | _kazakh | _tajik) - {r'eng'})),
+                    (r'Greek', (_greek - {r'eng'})), (r'Hebrew', (_hebrew - {r'eng'})),
+                    (r'Arabic', (_arabic_ext - {r'eng'})), (r'Thai', (_thai - {r'eng'})),
+                    (r'Chinese', _chinese), (r'Japanese', {r'ain', r'jpn'}), (r'Korean', {r'kor'}))
+
+def scriptLetters( languageISO6392=r'mul' ):
+    # ranges (for a regex character class) of the non-ASCII letters a language is written with
+    if (languageISO6392 in {r'', r'mul', r'und', r'zxx'}): return None
+    for script, languages in _scriptLanguages:
+        if (languageISO6392 in languages): return _scriptLetters[script]
+    return _scriptLetters[r'Latin']
+
+
+
+_ASCIIFallbacks = {
+    # punctuation, symbols and spaces
+    '\u2018':"'", '\u2019':"'", '\u201A':"'", '\u201B':"'", '\u2032':"'", '\u2039':'<',
+    '\u203A':'>', '\u201C':'"', '\u201D':'"', '\u201E':'"', '\u201F':'"', '\u2033':'"',
+    '\u00AB':'<<', '\u00BB':'>>', '\u2010':'-', '\u2011':'-', '\u2012':'-', '\u2013':'-',
+    '\u2014':'--', '\u2015':'--', '\u2212':'-', '\u2026':'...', '\u2022':'*', '\u00B7':'.',
+    '\u2044':'/', '\u2215':'/', '\u00D7':'x', '\u00F7':'/', '\u00A1':'!', '\u00BF':'?',
+    '\u00A6':'|', '\u00A9':'(C)', '\u00AE':'(R)', '\u00B0':'o', '\u00B1':'+/-',
+    '\u00A2':'c', '\u00A3':'GBP', '\u00A5':'JPY', '\u20AC':'EUR', '\u00A7':'S', '\u00B6':'P',
+    '\u2190':'<-', '\u2192':'->', '\u21D0':'<=', '\u21D2':'=>', '\u2264':'<=', '\u2265':'>=',
+    '\u2260':'!=', '\u2248':'~', '\u00AD':'', '\u200B':'', '\u200C':'', '\u200D':'',
+    '\u2060':'', '\uFEFF':'', '\u3000':' ', '\u3001':',', '\u3002':'.',
+    # letters which don't decompose into an ASCII one
+    '\u00C6':'AE', '\u00E6':'ae', '\u0152':'OE', '\u0153':'oe', '\u00D8':'O', '\u00F8':'o',
+    '\u00DF':'ss', '\u1E9E':'SS', '\u00D0':'D', '\u00F0':'d', '\u0110':'D', '\u0111':'d',
+    '\u00DE':'Th', '\u00FE':'th', '\u0141':'L', '\u0142':'l', '\u0131':'i', '\u0126':'H',
+    '\u0127':'h', '\u0166':'T', '\u0167':'t', '\u014A':'Ng', '\u014B':'ng', '\u0138':'q',
+    '\u0180':'b', '\u0191':'F', '\u0192':'f', '\u01B5':'Z', '\u01B6':'z', '\u0237':'j',
+    '\u0250':'a', '\u0254':'o', '\u0259':'e', '\u018F':'E', '\u025B':'e', '\u0190':'E',
+    # Cyrillic
+    '\u0430':'a', '\u0431':'b', '\u0432':'v', '\u0433':'g', '\u0434':'d', '\u0435':'e',
+    '\u0436':'zh', '\u0437':'z', '\u0438':'i', '\u0439':'y', '\u043A':'k', '\u043B':'l',
+    '\u043C':'m', '\u043D':'n', '\u043E':'o', '\u043F':'p', '\u0440':'r', '\u0441':'s',
+    '\u0442':'t', '\u0443':'u', '\u0444':'f', '\u0445':'kh', '\u0446':'ts', '\u0447':'ch',
+    '\u0448':'sh', '\u0449':'shch', '\u044A':'', '\u044B':'y', '\u044C':'', '\u044D':'e',
+    '\u044E':'yu', '\u044F':'ya', '\u0451':'yo', '\u0454':'ye', '\u0456':'i', '\u0457':'yi',
+    '\u0491':'g', '\u045E':'u', '\u0452':'dj', '\u0458':'j', '\u0459':'lj', '\u045A':'nj',
+    '\u045B':'c', '\u045F':'dz', '\u0455':'dz', '\u0453':'gj', '\u045C':'kj',
+    # Greek
+    '\u03B1':'a', '\u03B2':'v', '\u03B3':'g', '\u03B4':'d', '\u03B5':'e', '\u03B6':'z',
+    '\u03B7':'i', '\u03B8':'th', '\u03B9':'i', '\u03BA':'k', '\u03BB':'l', '\u03BC':'m',
+    '\u03BD':'n', '\u03BE':'x', '\u03BF':'o', '\u03C0':'p', '\u03C1':'r', '\u03C2':'s',
+    '\u03C3':'s', '\u03C4':'t', '\u03C5':'y', '\u03C6':'f', '\u03C7':'ch', '\u03C8':'ps',
+    '\u03C9':'o', '\u00B5':'m'}
+
+def _withUppercase( fallbacks ):
+    # the lowercase letters above, also as uppercase ones (unless already there)
+    result = dict()
+    for c, replacement in fallbacks.items():
+        if (c.islower() and (len(c.upper()) == 1) and (c.upper() not in fallbacks)):
+            result[c.upper()] = replacement.capitalize()
+        result[c] = replacement
+    return result
+
+_ASCIIFallbacks = _withUppercase(_ASCIIFallbacks)
+_ASCIITableRanges = ((0x0080, 0x3400), (0xA640, 0xA800), (0xFB00, 0x10000), (0x1D400, 0x1D800),
+                     (0x1F100, 0x1F200))
+_ASCIITable = None
+
+def _ASCIIOf( c ):
+    if (c in _ASCIIFallbacks): return _ASCIIFallbacks[c]
+    if (unicodeCombining(c)): return r''
+    result = []
+    for d in unicodeNormalize(r'NFKD', c):
+        if (d.isascii()): result.append(d)
+        elif (d in _ASCIIFallbacks): result.append(_ASCIIFallbacks[d])
+        elif (not unicodeCombining(d)): return None
+    return r''.join(result)
+
+def ASCIITable():
+    # str.translate() table from the non-ASCII characters which have an ASCII look-alike (or
+    # transliteration) to it, and from combining marks to nothing; built once, on first use
+    global _ASCIITable
+    if (_ASCIITable is None):
+        table = {codepoint:codepoint for codepoint in range(128)} # hits are much faster than misses
+        for beg, end in _ASCIITableRanges:
+            for codepoint in range(beg, end):
+                replacement = _ASCIIOf(chr(codepoint))
+                if (replacement is not None): table[codepoint] = replacement
+        _ASCIITable = table
+    return _ASCIITable
+
+_ASCIIAllCaps = None
+
+def ASCIIAllCaps():
+    # (regex of the uppercase letters whose look-alike in ASCIITable() isn't all uppercase,
+    # as 'Shch' for 'Щ', {each of them: its all-uppercase look-alike}), for words in capitals
+    global _ASCIIAllCaps
+    if (_ASCIIAllCaps is None):
+        allCaps = {chr(codepoint):replacement.upper() for codepoint, replacement in ASCIITable().items()
+                   if (isinstance(replacement, str) and chr(codepoint).isupper() and
+                       (replacement != replacement.upper()))}
+        _ASCIIAllCaps = (re.compile(r'[' + re.escape(r''.join(allCaps)) + r']'), allCaps)
+    return _ASCIIAllCaps
+
+
+
+# what HTML character references decode to, as with html.unescape(): numbered C1 controls
+# are taken as cp1252 (as browsers do), and other codepoints HTML doesn't allow are dropped
+_htmlDecoded = {(r'&' + name + r';'):chr(codepoint) for name, codepoint in html2codepoint.items()}
+_htmlC1Decoded = {codepoint:(bytes([codepoint]).decode(r'cp1252', r'ignore') or chr(codepoint))
+                  for codepoint in range(0x80, 0xA0)}
+_htmlInvalidCodepoints = frozenset([*range(0x01, 0x09), 0x0B, *range(0x0E, 0x20), 0x7F,
+                                    *range(0xFDD0, 0xFDF0)] +
+                                   [((plane << 16) | low) for plane in range(17) for low in (0xFFFE, 0xFFFF)])
+
+def _htmlDecodedEntity( match ):
+    entity = match.group()
+    if (entity[1] != r'#'): return _htmlDecoded.get(entity, entity)
+    codepoint = int(entity[3:-1], 16) if (entity[2] in r'xX') else int(entity[2:-1])
+    if (codepoint in _htmlC1Decoded): return _htmlC1Decoded[codepoint]
+    # no NULs, lone surrogates or numbers beyond Unicode
+    if ((codepoint == 0) or (0xD800 <= codepoint <= 0xDFFF) or (codepoint > 0x10FFFF)):
+        return '\uFFFD'
+    if (codepoint in _htmlInvalidCodepoints): return r''
+    return chr(codepoint)
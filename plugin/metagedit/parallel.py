@@ -0,0 +1,133 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+
+import os
+import sys
+from shutil import which
+
+
+
+## LINE OPERATIONS
+
+defaultLinesThreshold = 1000000
+_settings = None
+_processContext = None
+
+def linesThreshold():
+    # lines from which line operations are split across processes (0 means never)
+    # (gi is imported here only, as worker processes import this module too)
+    global _settings
+    try:
+        if (_settings is None):
+            from gi.repository import Gio
+            _settings = Gio.Settings.new(r'org.gnome.gedit.plugins.metagedit')
+        return _settings.get_value(r'parallel-lines-threshold').get_uint32()
+    except:
+        return defaultLinesThreshold
+
+def workerCount():
+    return len(os.sched_getaffinity(0)) if hasattr(os, r'sched_getaffinity') else (os.cpu_count() or 1)
+
+def worthParallelizing( lineCount ):
+    threshold = linesThreshold()
+    return ((threshold > 0) and (lineCount > threshold) and (workerCount() > 1))
+
+def _pythonExecutable():
+    # within gedit, sys.executable may well be gedit itself
+    if (os.path.basename(sys.executable or r'').startswith(r'python')): return sys.executable
+    python = os.path.join(sys.base_exec_prefix, r'bin', (r'python%d.%d' % sys.version_info[:2]))
+    return python if os.access(python, os.X_OK) else (which(r'python3') or sys.executable)
+
+def processPool( workers ):
+    # workers are forked from a fork server (forking gedit itself, which has threads of its
+    # own, could deadlock); in them, the plugin's modules get imported without its
+    # __init__.py (see _workerSetup), and only gi-free ones (see workerTasks.py) can be, as
+    # gedit's typelib can't be found outside of gedit
+    global _processContext
+    from concurrent.futures import ProcessPoolExecutor
+    if (_processContext is None):
+        from multiprocessing import get_context
+        _processContext = get_context(r'forkserver')
+        _processContext.set_executable(_pythonExecutable())
+    setup = _workerSetup % {r'package': __name__.rpartition(r'.')[0],
+                            r'folder': os.path.dirname(os.path.abspath(__file__))}
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_processContext,
+                               initializer=exec, initargs=(setup, dict()))
+
+# run by each worker (through exec(), which pickles as a builtin) before any task arrives
+_workerSetup = r'''
+import sys, types
+if (%(package)r not in sys.modules):
+    package = types.ModuleType(%(package)r)
+    package.__path__ = [%(folder)r]
+    sys.modules[package.__name__] = package
+'''
+
+
+
+class SharedBytes:
+    # bytes in a shared memory block, which worker processes read by name (sharedBytes())
+    # instead of having them pickled to each of their tasks
+
+    def __init__( self, data ):
+        from multiprocessing.shared_memory import SharedMemory
+        self._memory = SharedMemory(create=True, size=max(1, len(data)))
+        self._memory.buf[:len(data)] = data
+        self.name, self.size = (self._memory.name, len(data))
+
+    def close( self ):
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exception ):
+        self.close()
+
+def sharedBytes( name, start, end ):
+    from multiprocessing.shared_memory import SharedMemory
+    memory = SharedMemory(name=name)
+    try: return bytes(memory.buf[start:end])
+    finally: memory.close()
+
+
+
+class SharedLines(SharedBytes):
+    # lines joined with '\n' and UTF-8-encoded into shared memory; 'partitions' are
+    # (name, start, end, first line, is last) tuples, each one ending at a line boundary
+
+    def __init__( self, lines, partitionCount ):
+        data = '\n'.join(lines).encode(r'utf-8', r'surrogatepass')
+        SharedBytes.__init__(self, data)
+        self.partitions = []
+        start, firstLine = 0, 0
+        for i in range(1, (partitionCount + 1)):
+            end = data.find(b'\n', ((len(data) * i) // partitionCount)) + 1
+            if ((i == partitionCount) or (end <= 0)): end = len(data)
+            if (end <= start): continue
+            self.partitions.append((self.name, start, end, firstLine, (end == len(data))))
+            firstLine += data.count(b'\n', start, end)
+            start = end
+            if (end == len(data)): break
+
+def sharedLines( name, start, end, firstLine, isLast ):
+    # worker side of SharedLines: the lines of one partition
+    lines = sharedBytes(name, start, end).decode(r'utf-8', r'surrogatepass').split('\n')
+    if (not isLast): lines.pop() # the partition's final '\n' doesn't start a line
+    return lines
@@ -0,0 +1,384 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from unicodedata import normalize as unicodeNormalize
+
+
+
+cacheFolder = os.environ[r'HOME'] + r'/.cache/gedit/'
+
+
+
+def writeAtomically( path, content ):
+    # a crash (or a full disk) never leaves 'path' half-written; text is written as is (no
+    # newline translation)
+    temporaryPath = path + r'.tmp'
+    if (isinstance(content, bytes)): temporaryFile = open(temporaryPath, r'wb')
+    else: temporaryFile = open(temporaryPath, r'w', newline=r'')
+    with temporaryFile:
+        temporaryFile.write(content)
+        temporaryFile.flush()
+        os.fsync(temporaryFile.fileno())
+    os.replace(temporaryPath, path)
+
+
+
+## ENCODING STUFF
+
+def fileIdentity( path, fingerprintSize=4096 ):
+    # (size, mtime, fingerprint of the file's head and tail), or None if it can't be read
+    try:
+        status = os.stat(path)
+        with open(path, r'rb') as file:
+            fingerprint = blake2b(file.read(fingerprintSize), digest_size=8)
+            if (status.st_size > fingerprintSize):
+                file.seek(max(fingerprintSize, (status.st_size - fingerprintSize)))
+                fingerprint.update(file.read(fingerprintSize))
+        return [status.st_size, status.st_mtime_ns, fingerprint.hexdigest()]
+    except:
+        return None
+
+class EncodingCache:
+    # detected encodings of files, as {path: [identity, encoding, confidence]}, kept in
+    # least-recently-used order and capped at 'maxEntries'
+
+    def __init__( self, path=(cacheFolder + r'metagedit-encodings.json'), maxEntries=2000 ):
+        self.path = path
+        self.maxEntries = maxEntries
+        self._entries = None
+        self._reordered = False
+
+    def _load( self ):
+        if (self._entries is not None): return
+        try:
+            with open(self.path, r'r') as cacheFile:
+                self._entries = OrderedDict(json.load(cacheFile))
+        except:
+            self._entries = OrderedDict()
+
+    def _save( self ):
+        self._reordered = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            writeAtomically(self.path, json.dumps(list(self._entries.items())))
+        except:
+            pass
+
+    def get( self, path, identity ):
+        # (encoding, confidence) detected for the file, if it's still as 'identity' (see
+        # fileIdentity()) says; the order of use is written along with the next change
+        self._load()
+        entry = self._entries.get(path)
+        if ((entry is None) or (entry[0] != identity)): return None
+        if (next(reversed(self._entries)) != path):
+            self._entries.move_to_end(path)
+            self._reordered = True
+        return (entry[1], entry[2])
+
+    def put( self, path, encoding, confidence, identity ):
+        if (identity is None): return
+        self._load()
+        self._entries[path] = [identity, encoding, confidence]
+        self._entries.move_to_end(path)
+        while (len(self._entries) > self.maxEntries): self._entries.popitem(last=False)
+        self._save()
+
+    def flush( self ):
+        if (self._reordered): self._save()
+
+encodingCache = EncodingCache()
+
+
+
+## TRANSLATE
+
+class TranslationMemory:
+    # translated chunks, as {digest of (normalized chunk, language): translation}, kept in an
+    # SQLite file (the most recently used ones also in memory) and capped at 'maxEntries' by
+    # dropping the least recently used ones; used from the translators' threads too; hits only
+    # mark entries as used in memory, which is written by the next 'put' or 'flush'
+
+    _normalSpaces = re.compile(r'[\t ]+')
+
+    def __init__( self, path=(cacheFolder + r'metagedit-translations.sqlite'), maxEntries=20000,
+                  maxMemoryEntries=1000 ):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxMemoryEntries = maxMemoryEntries
+        self.hits, self.misses = (0, 0) # since gedit started
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._used = dict() # {key: clock} of the hits not written yet
+        self._database, self._entries, self._clock = (None, 0, 0)
+        self._loaded = False
+
+    def _load( self ):
+        if (self._loaded): return
+        self._loaded = True
+        try:
+            import sqlite3
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            database = sqlite3.connect(self.path, check_same_thread=False)
+            database.execute(r'CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, '
+                             r'translation TEXT NOT NULL, used INTEGER NOT NULL)')
+            database.execute(r'CREATE INDEX IF NOT EXISTS byUse ON translations (used)')
+            self._entries, self._clock = database.execute(
+                    r'SELECT COUNT(*), COALESCE(MAX(used), 0) FROM translations').fetchone()
+            self._database = database
+        except:
+            self._database = None # then, it's kept in memory only
+
+    def _key( self, chunk, language ):
+        chunk = self._normalSpaces.sub(r' ', unicodeNormalize(r'NFC', chunk.strip()))
+        return blake2b((language + '\0' + chunk).encode(r'utf-8'), digest_size=16).hexdigest()
+
+    def _remember( self, key, translation ):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while (len(self._memory) > self.maxMemoryEntries): self._memory.popitem(last=False)
+
+    def get( self, chunk, language ):
+        # the translation of 'chunk' to 'language', if it was translated before
+        key = self._key(chunk, language)
+        with self._lock:
+            self._load()
+            self._clock += 1
+            translation = self._memory.get(key)
+            if (translation is None):
+                try:
+                    row = self._database.execute(r'SELECT translation FROM translations WHERE key = ?',
+                                                 (key,)).fetchone()
+                    if (row is not None): translation = row[0]
+                except:
+                    pass
+            if (translation is None):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used[key] = self._clock
+            self._remember(key, translation)
+            return translation
+
+    def _writeUses( self ):
+        # (within a transaction, before anything is evicted by use)
+        if (not self._used): return
+        used, self._used = (self._used, dict())
+        self._database.executemany(r'UPDATE translations SET used = ? WHERE key = ?',
+                                   [(clock, key) for key, clock in used.items()])
+
+    def put( self, chunk, language, translation ):
+        key = self._key(chunk, language)
+        with self._lock:
+            self._load()
+            self._clock += 1
+            self._remember(key, translation)
+            self._used.pop(key, None)
+            try:
+                self._writeUses()
+                isNew = self._database.execute(r'SELECT 1 FROM translations WHERE key = ?',
+                                               (key,)).fetchone() is None
+                self._database.execute(r'INSERT OR REPLACE INTO translations VALUES (?, ?, ?)',
+                                       (key, translation, self._clock))
+                self._entries += isNew
+                if (self._entries > self.maxEntries):
+                    self._database.execute(r'DELETE FROM translations WHERE key IN (SELECT key FROM '
+                                           r'translations ORDER BY used LIMIT ?)',
+                                           ((self._entries - self.maxEntries),))
+                    self._entries = self.maxEntries
+                self._database.commit()
+            except:
+                pass
+
+    def flush( self ):
+        # writes which entries were used since the last 'put' or 'flush', all in one commit
+        with self._lock:
+            if ((not self._used) or (self._database is None)): return
+            try:
+                self._writeUses()
+                self._database.commit()
+            except:
+                pass
+
+    def statistics( self ):
+        # (translations kept, hits, misses)
+        with self._lock:
+            self._load()
+            entries = self._entries if (self._database is not None) else len(self._memory)
+            return (entries, self.hits, self.misses)
+
+translationMemory = TranslationMemory()
+
+
+
+## SESSIONS
+
+class SessionIndex:
+    # {session: [tab count, mtime, active file]} for the session files in 'folder', kept in a
+    # hidden file there; it's rebuilt whenever the folder changed after it was last written
+    # (session files added, removed or renamed behind its back), except when updating it for a
+    # change it's told about, when only the names in the folder are checked
+
+    def __init__( self, folder, fileName=r'.metagedit-index.json' ):
+        self.folder = folder
+        self.path = folder + fileName
+
+    def _read( self, checkFolder=True ):
+        try:
+            if (checkFolder and (os.stat(self.folder).st_mtime_ns > os.stat(self.path).st_mtime_ns)):
+                return None
+            with open(self.path, r'r') as indexFile: return json.load(indexFile)
+        except:
+            return None
+
+    def _write( self, sessions ):
+        try:
+            writeAtomically(self.path, json.dumps(sessions))
+            os.utime(self.path) # not older than the folder change writing it made
+        except:
+            pass
+
+    def _entry( self, session ):
+        path = self.folder + session
+        try:
+            with open(path, r'r') as sessionFile: entries = sessionFile.read().splitlines()
+            mtime = os.stat(path).st_mtime
+        except:
+            return None
+        active = [entry.split('\t', 4)[-1] for entry in entries if entry.startswith(r'x')]
+        return [len(entries), mtime, (active[0] if active else r'')]
+
+    def _names( self ):
+        try: return set([name for name in os.listdir(self.folder) if (not name.startswith(r'.'))])
+        except: return set()
+
+    def _rebuilt( self, names=None ):
+        sessions = dict()
+        for session in (self._names() if (names is None) else names):
+            entry = self._entry(session)
+            if (entry is not None): sessions[session] = entry
+        return sessions
+
+    def sessions( self ):
+        sessions = self._read()
+        if (sessions is None):
+            sessions = self._rebuilt()
+            self._write(sessions)
+        return sessions
+
+    def _sessionsBesides( self, *changed ):
+        # the index, rebuilt if the folder has anything else than 'changed' new to it
+        sessions = self._read(False)
+        names = self._names()
+        if ((sessions is None) or ((set(sessions) - set(changed)) != (names - set(changed)))):
+            sessions = self._rebuilt(names)
+        return sessions
+
+    def update( self, session ):
+        sessions = self._sessionsBesides(session)
+        entry = self._entry(session)
+        if (entry is None): sessions.pop(session, None)
+        else: sessions[session] = entry
+        self._write(sessions)
+
+    def remove( self, session ):
+        sessions = self._sessionsBesides(session)
+        sessions.pop(session, None)
+        self._write(sessions)
+
+    def rename( self, session, newName ):
+        sessions = self._sessionsBesides(session, newName)
+        entry = sessions.pop(session, None)
+        if (entry is None): entry = self._entry(newName)
+        if (entry is None): sessions.pop(newName, None)
+        else: sessions[newName] = entry
+        self._write(sessions)
+
+
+
+## RESTORE UNSAVED DOCUMENTS
+
+class BackgroundWriter:
+    # writes (see writeAtomically()), appends to and removes files from a thread of its own,
+    # in order; a file queued again before being written only gets its latest content written
+    # (with anything appended since added to it)
+
+    def __init__( self ):
+        self._pending = OrderedDict() # path: (appending, content), content None to remove it
+        self._writing = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _queue( self, path, content, appending=False ):
+        with self._condition:
+            previous = self._pending.get(path)
+            if ((not appending) or (previous is None)):
+                self._pending[path] = (appending, content)
+                self._pending.move_to_end(path)
+            elif (previous[1] is None): # removed, then appended to
+                self._pending[path] = (False, content)
+            else:
+                self._pending[path] = (previous[0], (previous[1] + content))
+            if (self._thread is None):
+                self._thread = threading.Thread(target=self._run, name=r'metagedit-writer', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def write( self, path, content ):
+        self._queue(path, content)
+
+    def append( self, path, content ):
+        self._queue(path, content, True)
+
+    def remove( self, path ):
+        self._queue(path, None)
+
+    def _run( self ):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: (len(self._pending) > 0))
+                path, (appending, content) = self._pending.popitem(last=False)
+                self._writing = True
+            try:
+                if (content is None):
+                    if (os.path.isfile(path)): os.remove(path)
+                elif (appending):
+                    with open(path, r'a', newline=r'') as file:
+                        file.write(content)
+                        file.flush()
+                        os.fsync(file.fileno())
+                else:
+                    writeAtomically(path, content)
+            except:
+                pass
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+    def flush( self, timeout=None ):
+        # waits until all that was queued is done (or for 'timeout' seconds at most)
+        with self._condition:
+            return self._condition.wait_for(lambda: ((len(self._pending) == 0) and (not self._writing)),
+                                            timeout)
+
+backgroundWriter = BackgroundWriter()
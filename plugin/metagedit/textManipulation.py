@@ -17,24 +17,44 @@
 # =============================================================================================
 
 import re
-from codecs import lookup as codecLookup
-from random import shuffle
-from unicodedata import normalize as unicodeNormalize, combining as unicodeCombining
+import json
+from codecs import lookup as codecLookup, getincrementaldecoder as getIncrementalDecoder
+from random import shuffle, Random
+from array import array
+from hashlib import blake2b
+from heapq import merge as heapMerge
+from itertools import groupby, repeat
+from bisect import bisect_left
+from operator import itemgetter
+from tempfile import TemporaryFile
+from threading import local as threadLocal, Lock, Thread
+from queue import Queue, Empty
 from urllib.parse import quote as urlquote, unquote as urlunquote
-from html.entities import codepoint2name as codepoint2html, name2codepoint as html2codepoint
-from chardet import detect as detectEncoding
-try:
-    from googletrans import Translator, LANGUAGES as translatorLANGUAGES
-    from textwrap import wrap as textWrap
-    translationIsAvailable = True
-except:
-    translationIsAvailable = False
+from html.entities import codepoint2name as codepoint2html
+from importlib.util import find_spec
+from gi.repository import Gio, GLib
+# chardet, googletrans and textwrap are only imported when first needed
+translationIsAvailable = (find_spec(r'googletrans') is not None)
 
 from .code import *
+from .parallel import SharedLines, SharedBytes, processPool, worthParallelizing, workerCount
+from .workerTasks import _emptyLine, _lineDigest, _dedupedPartition, _sortedPartition, _sortKeys, codecName, _encodingPenalty, _detectedEncoding
+from .encodingsAndLanguages import scriptLetters, ASCIITable, ASCIIAllCaps, _htmlDecodedEntity
+from .storage import encodingCache, translationMemory, backgroundWriter, fileIdentity
+from .bufferApplier import BufferApplier, pending, applyText, applyLines, applyPieces, isBeingApplied, cancelApplying, finishApplying
 
 
 
-_emptyLine = re.compile(r'^\s*$')
+_lineParts = re.compile(r'^([\t ]*)(.*?)(\s*)$')
+_trailingSpaces = re.compile(r'[\f\t \u2000-\u200A\u205F\u3000]+$', re.MULTILINE)
+
+## LINE OPERATIONS
+externalSortThreshold = 64 * 1024 * 1024 # characters; above it, sorting spills to disk
+_externalSortRunSize = 8 * 1024 * 1024 # characters per sorted run
+hashedDedupThreshold = 4000000 # lines; above it, dedup remembers digests, not the lines
+hashedDedupVerification = False # whether to rule out digest collisions by comparing lines
+_dedupDigestSize = 16 # bytes
+sortModes = (r'Text', r'Numbers', r'Natural', r'Versions')
 
 
 
@@ -71,31 +91,303 @@ def getSelectedLines( document, noSelectionMeansEverything=True ):
 
 
 
+_readChunkSize = 1024 * 1024 # characters
+
+def chunksOf( document, beg, end, chunkSize=_readChunkSize ):
+    # reads [beg, end) a slice at a time, instead of copying it all at once
+    sliceBeg = beg.copy()
+    while (sliceBeg.compare(end) < 0):
+        sliceEnd = sliceBeg.copy()
+        sliceEnd.forward_chars(chunkSize)
+        if (sliceEnd.compare(end) > 0): sliceEnd = end.copy()
+        yield document.get_text(sliceBeg, sliceEnd, False)
+        sliceBeg = sliceEnd
+
+def _lineSlices( document, beg, end, chunkSize=_readChunkSize ):
+    # chunksOf() as (offset, text) slices, all of which (but the last) end right after a '\n'
+    offset, carried = (beg.get_offset(), r'')
+    for chunk in chunksOf(document, beg, end, chunkSize):
+        text = carried + chunk
+        cut = text.rfind('\n') + 1
+        if (cut == 0):
+            carried = text
+            continue
+        yield (offset, text[:cut])
+        offset, carried = ((offset + cut), text[cut:])
+    yield (offset, carried)
+
+def linesOf( document, beg, end, separator=None, chunkSize=_readChunkSize ):
+    # same lines as get_text(beg, end).splitlines() (or .split(separator), for '\n')
+    for offset, text in _lineSlices(document, beg, end, chunkSize):
+        if (separator is None): yield from text.splitlines()
+        elif (text.endswith(separator)): yield from text[:-1].split(separator)
+        else: yield from text.split(separator)
+
+
+
+def _commonPrefixLength( a, b ):
+    low, high = 0, min(len(a), len(b))
+    while (low < high):
+        middle = (low + high + 1) // 2
+        if (a[:middle] == b[:middle]): low = middle
+        else: high = middle - 1
+    return low
+
+def _commonSuffixLength( a, b, limit ):
+    low, high = 0, min(len(a), len(b), limit)
+    while (low < high):
+        middle = (low + high + 1) // 2
+        if (a[(len(a) - middle):] == b[(len(b) - middle):]): low = middle
+        else: high = middle - 1
+    return low
+
+def _lineHunks( text, lines, newLines ):
+    ## LINE OPERATIONS
+    # consecutive changed lines are merged into one hunk: (start, end, replacement)
+    hunks = []
+    position, i, lineCount = 0, 0, len(lines)
+    while (i < lineCount):
+        if (newLines[i] == lines[i]):
+            position += len(lines[i]) + 1
+            i += 1
+            continue
+        start, replacement = position, []
+        while ((i < lineCount) and (newLines[i] != lines[i])):
+            position += len(lines[i]) + 1
+            if (newLines[i] is not None): replacement.append(newLines[i])
+            i += 1
+        if (i < lineCount):
+            hunks.append((start, position, r''.join([(line + '\n') for line in replacement])))
+        else: # last line has no newline of its own
+            if ((len(replacement) == 0) and (start > 0)): start -= 1
+            hunks.append((start, len(text), '\n'.join(replacement)))
+    return hunks
+
+def _bulkLineEdit( document, beg, end, transform, sliceBySlice=False ):
+    ## LINE OPERATIONS
+    # 'transform' gets the lines in [beg, end) and returns them aligned, each one kept,
+    # changed or replaced by None (removed); only the changed parts are written back,
+    # so the cursor, marks and undo history of untouched lines are left alone; when
+    # 'sliceBySlice', it gets _lineSlices() one at a time, so it must work line by line
+    # and keep each slice's last line as is (for all but the last, it's an empty one)
+    if (sliceBySlice): slices = _lineSlices(document, beg, end)
+    else: slices = ((beg.get_offset(), document.get_text(beg, end, False)),)
+    edits = []
+    for baseOffset, text in slices:
+        lines = text.split('\n')
+        for start, stop, replacement in _lineHunks(text, lines, transform(lines)):
+            old = text[start:stop]
+            prefixLength = _commonPrefixLength(old, replacement)
+            suffixLength = _commonSuffixLength(old, replacement,
+                                               (min(len(old), len(replacement)) - prefixLength))
+            edits.append(((baseOffset + start + prefixLength), (baseOffset + stop - suffixLength),
+                          replacement[prefixLength:(len(replacement) - suffixLength)]))
+    for start, stop, replacement in reversed(edits):
+        editBeg = document.get_iter_at_offset(start)
+        if (stop > start): document.delete(editBeg, document.get_iter_at_offset(stop))
+        if (len(replacement) > 0): document.insert(editBeg, replacement)
+    return len(edits)
+
+
+
+class DirtyLines:
+    # lines edited since the last save (or load), as sorted and disjoint (first, last)
+    # intervals that follow the buffer's edits; 'intervals' is None while they're unknown
+    # (i.e. until the document is loaded or saved, unless it's known to be as it was
+    # loaded, see reset(), or when there are too many to be worth tracking)
+
+    maxIntervals = 4096
+
+    def __init__( self, document ):
+        self.intervals = None
+        self._handlers = (document.connect(r'insert-text', self._onInsertText),
+                          document.connect(r'delete-range', self._onDeleteRange),
+                          document.connect(r'loaded', self._onLoaded))
+
+    def disconnect( self, document ):
+        for handler in self._handlers: document.disconnect(handler)
+
+    def reset( self ):
+        self.intervals = []
+
+    def _onLoaded( self, document, *arguments ):
+        self.reset()
+
+    def _onInsertText( self, document, location, text, length ):
+        if (self.intervals is not None):
+            self._edit(location.get_line(), location.get_line(), text.count('\n'))
+
+    def _onDeleteRange( self, document, beg, end ):
+        if (self.intervals is not None): self._edit(beg.get_line(), end.get_line(), 0)
+
+    def _edit( self, first, last, newLineCount ):
+        # lines first..last became first..(first + newLineCount), later ones are shifted
+        shift = first + newLineCount - last
+        i = bisect_left(self.intervals, (first,))
+        if ((i > 0) and (self.intervals[(i - 1)][1] >= (first - 1))): i -= 1
+        intervals = self.intervals[:i]
+        edited = [first, (first + newLineCount)]
+        for a, b in self.intervals[i:]:
+            if (a <= last): # overlaps (or touches) the edited lines
+                edited[0] = min(edited[0], a)
+                edited[1] = max(edited[1], ((b + shift) if (b > last) else edited[1]))
+            elif ((edited is not None) and ((a + shift) <= (edited[1] + 1))):
+                edited[1] = max(edited[1], (b + shift))
+            else:
+                if (edited is not None): intervals.append(tuple(edited))
+                edited = None
+                intervals.append(((a + shift), (b + shift)))
+        if (edited is not None): intervals.append(tuple(edited))
+        self.intervals = intervals if (len(intervals) <= self.maxIntervals) else None
+
+## RESTORE UNSAVED DOCUMENTS
+
+_journalFlushDelay = 300 # milliseconds from an edit to it being journaled
+_journalCompactionSize = 1 << 22 # journaled characters (past the snapshot's size too) to compact
+
+def _snapshotDigest( content ):
+    return blake2b(content.encode(r'utf-8', r'surrogatepass'), digest_size=16).hexdigest()
+
+class EditJournal:
+    # keeps an unsaved document in 'path' as a snapshot plus a journal ('path'.journal) of the
+    # edits made since, appended in batches by the background writer (and compacted into a new
+    # snapshot once it outgrows the last one); it starts on the first edit (or on start()) and
+    # stops when the document gets saved somewhere; the journal's first line is the digest of
+    # the snapshot it follows, so a snapshot and a journal out of step never get mixed
+
+    def __init__( self, document, path, whenStarted=None, snapshotSize=None, journaled=0 ):
+        self.path = path
+        self.whenStarted = whenStarted
+        self.started = (snapshotSize is not None)
+        self.snapshotSize = snapshotSize or 0
+        self.journaled = journaled
+        self._document = document
+        self._pending = []
+        self._flushSource = None
+        self._handlers = (document.connect(r'insert-text', self._onInsertText),
+                          document.connect(r'delete-range', self._onDeleteRange),
+                          document.connect(r'saved', lambda d: self.discard()))
+
+    def disconnect( self, document ):
+        for handler in self._handlers: document.disconnect(handler)
+        self._handlers = ()
+        if (self._flushSource is not None): GLib.source_remove(self._flushSource)
+        self._flushSource = None
+
+    def start( self, content ):
+        # 'content' being what the document has right now
+        self._pending = []
+        self._snapshot(content)
+        self.started = True
+        if (self.whenStarted is not None): self.whenStarted()
+
+    def _snapshot( self, content ):
+        backgroundWriter.write(self.path, content)
+        backgroundWriter.write((self.path + r'.journal'), (_snapshotDigest(content) + '\n'))
+        self.snapshotSize = len(content)
+        self.journaled = 0
+
+    def _beforeEdit( self, document ):
+        if (self.started): return True
+        if (document.get_file().get_location() is not None): # a file (being loaded)
+            self.disconnect(document)
+            return False
+        self.start(document.get_text(document.get_start_iter(), document.get_end_iter(), False))
+        return True
+
+    def _journal( self, edit, size ):
+        self._pending.append(json.dumps(edit))
+        self.journaled += size
+        if (self._flushSource is None):
+            self._flushSource = GLib.timeout_add(_journalFlushDelay, self._onFlushTimeout)
+
+    def _onInsertText( self, document, location, text, length ):
+        if (self._beforeEdit(document)): self._journal((location.get_offset(), text), len(text))
+
+    def _onDeleteRange( self, document, beg, end ):
+        if (self._beforeEdit(document)):
+            self._journal((beg.get_offset(), (beg.get_offset() - end.get_offset())), 1)
+
+    def _onFlushTimeout( self ):
+        self._flushSource = None
+        self.flush()
+        return False
+
+    def flush( self ):
+        if (len(self._pending) < 1): return
+        if (self.journaled > max(_journalCompactionSize, self.snapshotSize)):
+            document = self._document
+            self._snapshot(document.get_text(document.get_start_iter(), document.get_end_iter(), False))
+        else:
+            backgroundWriter.append((self.path + r'.journal'), ('\n'.join(self._pending) + '\n'))
+        self._pending = []
+
+    def discard( self ):
+        # drops the document's snapshot and journal (as for a closed or saved document)
+        self.disconnect(self._document)
+        self._pending = []
+        if (self.started):
+            backgroundWriter.remove(self.path)
+            backgroundWriter.remove(self.path + r'.journal')
+        self.started = False
+
+def restoreJournaled( document, path ):
+    # inserts the snapshot in 'path' into 'document' and replays its journal on top of it;
+    # returns (snapshot size, journaled size) for an EditJournal to carry on from there, or
+    # None if it needs a new snapshot (no journal, one out of step, or one with a torn edit)
+    with open(path, r'r', newline=r'') as snapshotFile: content = snapshotFile.read()
+    document.insert(document.get_end_iter(), content)
+    journaled = 0
+    try:
+        with open((path + r'.journal'), r'r', newline=r'') as journalFile:
+            if (journalFile.readline().strip() != _snapshotDigest(content)): return None
+            for line in journalFile:
+                offset, edit = json.loads(line)
+                if (isinstance(edit, str)):
+                    document.insert(document.get_iter_at_offset(offset), edit)
+                    journaled += len(edit)
+                else:
+                    document.delete(document.get_iter_at_offset(offset),
+                                    document.get_iter_at_offset(offset - edit))
+                    journaled += 1
+    except:
+        return None
+    return (len(content), journaled)
+
+def _trailingSpacesRemoved( lines ):
+    return _trailingSpaces.sub(r'', '\n'.join(lines)).split('\n')
+
 def removeTrailingSpaces( document, onSaveMode=False ):
     ## REMOVE TRAILING SPACES
-    trailingSpaces = re.compile(r'[\f\t \u2000-\u200A\u205F\u3000]+$')
+    if (isBeingApplied(document)): return
+    dirtyLines = getattr(document, r'metageditDirtyLines', None)
+    if (onSaveMode and (dirtyLines is not None) and (dirtyLines.intervals is not None)):
+        # only the lines edited since the last save
+        document.begin_user_action()
+        lineCount = document.get_line_count()
+        for first, last in reversed(dirtyLines.intervals):
+            if (first >= lineCount): continue
+            end = document.get_iter_at_line(min(last, (lineCount - 1)))
+            if (not end.ends_line()): end.forward_to_line_end()
+            _bulkLineEdit(document, document.get_iter_at_line(first), end, _trailingSpacesRemoved, True)
+        removeTrailingNewlines(document)
+        document.end_user_action()
+        dirtyLines.reset()
+        return
     if (onSaveMode):
         beg, end, noneSelected = (document.get_start_iter(), document.get_end_iter(), True)
     else:
         beg, end, noneSelected = getSelectedLines(document)
-    selection = document.get_text(beg, end, False)
     document.begin_user_action()
     if (noneSelected): # whole-document mode (doesn't move the cursor)
-        lineNumber = 0
-        for line in selection.splitlines():
-            if (len(line) != 0):
-                beg.set_line(lineNumber)
-                beg.set_line_offset(len(trailingSpaces.sub(r'', line)))
-                end.set_line(lineNumber)
-                end.set_line_offset(len(line))
-                document.delete(beg, end)
-            lineNumber += 1
+        _bulkLineEdit(document, beg, end, _trailingSpacesRemoved, True)
         removeTrailingNewlines(document)
     else: # selection mode
-        selection = trailingSpaces.sub(r'', selection, flags=re.MULTILINE)
+        selection = _trailingSpaces.sub(r'', document.get_text(beg, end, False))
         document.delete(beg, end)
         document.insert_at_cursor(selection)
     document.end_user_action()
+    if (onSaveMode and (dirtyLines is not None)): dirtyLines.reset()
 
 
 def removeTrailingNewlines( document ):
@@ -113,21 +405,18 @@ def removeTrailingNewlines( document ):
 
 def removeEmptyLines( document ): #TODO: selection mode inserts trailing newlines for some reason - deleting everything
     ## LINE OPERATIONS
+    if (isBeingApplied(document)): return
     beg, end, noneSelected = getSelectedLines(document)
     document.begin_user_action()
     if (noneSelected): # whole-document mode (doesn't move the cursor)
-        for lineNumber in reversed(range(0, (document.get_line_count() - 1))):
-            beg.set_line(lineNumber)
-            end.set_line(lineNumber)
-            if (not end.ends_line()): end.forward_to_line_end()
-            if (_emptyLine.match(document.get_text(beg, end, False))):
-                end.forward_char()
-                document.delete(beg, end)
+        emptyLinesRemoved = lambda lines: ([(None if _emptyLine.match(line) else line)
+                                            for line in lines[:-1]] + lines[-1:])
+        _bulkLineEdit(document, beg, end, emptyLinesRemoved, True)
         removeTrailingNewlines(document)
     else: # selection mode
         beg.backward_char()
         selection = document.get_text(beg, end, False)
-        if (_emptyLine.match(selection, flags=re.MULTILINE)): selection = r''
+        if (_emptyLine.match(selection)): selection = r''
         selection = re.sub(r'\n\s*\n', r'\n', selection, flags=re.MULTILINE)
         document.delete(beg, end)
         document.insert_at_cursor(selection)
@@ -137,6 +426,7 @@ def removeEmptyLines( document ): #TODO: selection mode inserts trailing newline
 
 def removeLines( document ):
     ## LINE OPERATIONS
+    if (isBeingApplied(document)): return
     beg, end, noneSelected = getSelectedLines(document, False)
     if (not noneSelected): beg.backward_char()
     document.begin_user_action()
@@ -148,13 +438,10 @@ def removeLines( document ):
 def joinLines( document, separatedWithSpaces=True ):
     ## LINE OPERATIONS
     beg, end, noneSelected = getSelectedLines(document)
-    selection = document.get_text(beg, end, False)
-    selection = re.sub(r'\n\s*\n', r'\n', selection, flags=re.MULTILINE).strip()
-    selection = selection.replace('\n', (r' ' if separatedWithSpaces else r''))
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor(selection)
-    document.end_user_action()
+    # blank lines are dropped (like re.sub(r'\n\s*\n', '\n', selection) would do)
+    selection = [line for line in linesOf(document, beg, end, '\n') if not _emptyLine.match(line)]
+    selection = (r' ' if separatedWithSpaces else r'').join(selection).strip()
+    applyText(document, beg, end, selection)
 
 
 
@@ -165,88 +452,280 @@ def reverseLines( document ):
         cursorPosition = document.get_iter_at_mark(document.get_insert())
         line = document.get_line_count() - (cursorPosition.get_line() + 1)
         column = cursorPosition.get_line_offset()
-    selection = document.get_text(beg, end, False).splitlines()
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor('\n'.join(reversed(selection)))
-    if (noneSelected):
-        document.place_cursor(document.get_iter_at_line_offset(line, column))
-    document.end_user_action()
+    def placeCursor( applied ):
+        if (applied and noneSelected):
+            document.place_cursor(document.get_iter_at_line_offset(line, column))
+    selection = list(linesOf(document, beg, end))
+    selection.reverse()
+    applyLines(document, beg, end, selection, placeCursor)
 
 
 
-def _dedupedLines( selection, caseSensitive=True, KeepEmptyOnes=False, offset=0 ):
+class _DigestSet:
+    ## LINE OPERATIONS
+    # open-addressing (linear probing) set of 64/128-bit digests, stored as machine words in
+    # arrays instead of as Python objects; the lowest bit of every digest is set, so that a
+    # zero low word means "empty" (which makes digests differing only there the same)
+
+    def __init__( self, digestSize=16, capacity=4096 ):
+        self._capacity = capacity
+        self._low = array(r'Q', [0]) * capacity
+        self._high = (array(r'Q', [0]) * capacity) if (digestSize > 8) else None
+        self.count = 0
+
+    def _grow( self ):
+        low, high = (self._low, self._high)
+        self.__init__((16 if (high is not None) else 8), (2 * self._capacity))
+        for i in range(len(low)):
+            if (low[i]): self.add(low[i], (0 if (high is None) else high[i]))
+
+    def _slot( self, low, high ):
+        # where the digest is, or the empty slot where it would go
+        lows, highs, mask = (self._low, self._high, (self._capacity - 1))
+        slot = low & mask
+        while (True):
+            slotLow = lows[slot]
+            if (slotLow == 0): return slot
+            if ((slotLow == low) and ((highs is None) or (highs[slot] == high))): return slot
+            slot = (slot + 1) & mask
+
+    def add( self, low, high=0 ):
+        # returns whether the digest was not there yet
+        low |= 1
+        if ((2 * (self.count + 1)) > self._capacity): self._grow()
+        slot = self._slot(low, high)
+        if (self._low[slot] != 0): return False
+        self._low[slot] = low
+        if (self._high is not None): self._high[slot] = high
+        self.count += 1
+        return True
+
+    def contains( self, low, high=0 ):
+        low |= 1
+        return (self._low[self._slot(low, high)] != 0)
+
+    def memoryUsage( self ):
+        return (self._capacity * 8) * (1 if (self._high is None) else 2)
+
+
+
+def _hashedDuplicatesRemoved( lines, caseSensitive=True, KeepEmptyOnes=False, offset=0,
+                              verify=False, digestSize=16 ):
+    ## LINE OPERATIONS
+    # same result as _duplicatesRemoved(), but only digests of the lines are kept around
+    finalContent = []
+    addDigest = _DigestSet(digestSize).add
+    collidable = _DigestSet(digestSize) # digests which made some line be dropped
+    for line in lines:
+        line_ = line[offset:] if caseSensitive else line[offset:].casefold()
+        if (KeepEmptyOnes and _emptyLine.match(line_)):
+            finalContent.append(line)
+            continue
+        digest = _lineDigest(line_, digestSize)
+        if (addDigest(*digest)):
+            finalContent.append(line)
+        else:
+            finalContent.append(None)
+            if (verify): collidable.add(*digest)
+    if (verify and (collidable.count > 0)):
+        # exact-verification pass: only lines sharing a digest with a dropped one are compared,
+        # with the first line of each different content (kept by index, not as a copy)
+        firstLines = dict()
+        for i, line in enumerate(lines):
+            line_ = line[offset:] if caseSensitive else line[offset:].casefold()
+            if (KeepEmptyOnes and _emptyLine.match(line_)): continue
+            digest = _lineDigest(line_, digestSize)
+            if (not collidable.contains(*digest)): continue
+            sameDigest = firstLines.setdefault(digest, [])
+            for j in sameDigest:
+                first = lines[j][offset:] if caseSensitive else lines[j][offset:].casefold()
+                if (first == line_): break
+            else:
+                sameDigest.append(i)
+                finalContent[i] = line # undo drops caused by a digest collision
+    return finalContent
+
+def _parallelDuplicatesRemoved( lines, caseSensitive=True, KeepEmptyOnes=False, offset=0 ):
+    ## LINE OPERATIONS
+    # partitions are deduped by worker processes; here, only their survivors' digests are
+    # checked against the ones of previous partitions
+    finalContent = [None] * len(lines)
+    if (len(lines) > hashedDedupThreshold):
+        isNew = _DigestSet().add
+    else:
+        seen = set()
+        isNew = lambda low, high: (((low, high) not in seen) and (seen.add((low, high)) is None))
+    with SharedLines(lines, workerCount()) as shared:
+        with processPool(len(shared.partitions)) as pool:
+            partitionsKept = pool.map(_dedupedPartition, shared.partitions, repeat(caseSensitive),
+                                      repeat(KeepEmptyOnes), repeat(offset))
+            for partition, kept in zip(shared.partitions, partitionsKept):
+                firstLine = partition[3]
+                for i, digest in kept:
+                    if ((digest is None) or isNew(*digest)):
+                        finalContent[firstLine + i] = lines[firstLine + i]
+    return finalContent
+
+def _duplicatesRemoved( lines, caseSensitive=True, KeepEmptyOnes=False, offset=0, hashed=None,
+                        parallel=None ):
     ## LINE OPERATIONS
-    emptyLine = re.compile(r'^\s*$')
+    # aligned with 'lines': repeated ones (but the first) are replaced by None
+    if (parallel is None): parallel = worthParallelizing(len(lines))
+    if (parallel):
+        try: return _parallelDuplicatesRemoved(lines, caseSensitive, KeepEmptyOnes, offset)
+        except: pass # no workers (e.g. a broken pool), so done right here instead
+    if (hashed is None): hashed = (len(lines) > hashedDedupThreshold)
+    if (hashed):
+        return _hashedDuplicatesRemoved(lines, caseSensitive, KeepEmptyOnes, offset,
+                                        hashedDedupVerification, _dedupDigestSize)
     finalContent = []
     seen = set()
-    for line in selection:
+    for line in lines:
         line_ = line[offset:] if caseSensitive else line[offset:].casefold()
         if (line_ not in seen):
             finalContent.append(line)
-            if (not (KeepEmptyOnes and emptyLine.match(line_))): seen.add(line_)
+            if (not (KeepEmptyOnes and _emptyLine.match(line_))): seen.add(line_)
+        else:
+            finalContent.append(None)
     return finalContent
 
-def dedupLines( document, caseSensitive=False, KeepEmptyOnes=False, offset=0 ):
+def _dedupedLines( selection, caseSensitive=True, KeepEmptyOnes=False, offset=0 ):
+    ## LINE OPERATIONS
+    selection = _duplicatesRemoved(selection, caseSensitive, KeepEmptyOnes, offset)
+    return [line for line in selection if line is not None]
+
+def dedupLines( document, caseSensitive=False, KeepEmptyOnes=False, offset=0, reverse=False ):
     ## LINE OPERATIONS
-    emptyLine = re.compile(r'^\s*$')
+    # 'reverse' also reverses the lines left (in the same pass, for a selection)
+    if (isBeingApplied(document)): return
     beg, end, noneSelected = getSelectedLines(document)
-    document.begin_user_action()
     if (noneSelected): # whole-document mode (doesn't move the cursor)
-        seen = set()
-        for lineNumber in reversed(range(0, document.get_line_count())):
-            beg.set_line(lineNumber)
-            end.set_line(lineNumber)
-            if (not end.ends_line()): end.forward_to_line_end()
-            line = document.get_text(beg, end, False)[offset:]
-            if (not caseSensitive): line = line.casefold()
-            if ((not (KeepEmptyOnes and emptyLine.match(line))) and
-                ((line in seen) or seen.add(line))):
-                end.forward_char()
-                document.delete(beg, end)
+        document.begin_user_action()
+        _bulkLineEdit(document, beg, end,
+                      lambda lines: _duplicatesRemoved(lines, caseSensitive, KeepEmptyOnes, offset))
+        if (reverse): reverseLines(document)
+        document.end_user_action()
     else: # selection mode
-        selection = document.get_text(beg, end, False).splitlines()
-        document.delete(beg, end)
+        selection = list(linesOf(document, beg, end))
         selection = _dedupedLines(selection, caseSensitive, KeepEmptyOnes, offset)
-        document.insert_at_cursor('\n'.join(selection))
-    document.end_user_action()
+        if (reverse): selection.reverse()
+        applyLines(document, beg, end, selection)
 
 
 
 def shuffleLines( document, dedup=False, caseSensitive=False, offset=0 ):
     ## LINE OPERATIONS
     beg, end, noneSelected = getSelectedLines(document)
-    selection = document.get_text(beg, end, False).splitlines()
-    if (dedup): selection = _dedupedLines(selection, caseSensitive, offset)
+    selection = list(linesOf(document, beg, end))
+    if (dedup): selection = _dedupedLines(selection, caseSensitive, offset=offset)
     shuffle(selection)
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor('\n'.join(selection))
-    document.end_user_action()
+    applyLines(document, beg, end, selection)
+
+
 
+def _sortedRuns( lines, sortKey, reverse=False ):
+    ## LINE OPERATIONS
+    # spills 'lines' to temporary files as sorted runs of bounded size; when 'reverse',
+    # runs come out last-first and internally reversed, so merging them descending
+    # gives exactly reversed(sorted(lines)) (ties in reverse order of appearance)
+    runs, run, runSize = [], [], 0
+    def spill():
+        run.sort(key=sortKey, reverse=reverse)
+        runFile = TemporaryFile(r'w+', encoding=r'utf-8', newline='\n')
+        runFile.writelines([(line + '\n') for line in run])
+        runFile.seek(0)
+        runs.append(runFile)
+        run.clear()
+    try:
+        for line in lines:
+            run.append(line)
+            runSize += len(line) + 1
+            if (runSize >= _externalSortRunSize):
+                if (reverse): run.reverse()
+                spill()
+                runSize = 0
+        if ((len(run) > 0) or (len(runs) == 0)):
+            if (reverse): run.reverse()
+            spill()
+    except:
+        for runFile in runs: runFile.close()
+        raise
+    if (reverse): runs.reverse()
+    return runs
+
+def _mergedSortedPairs( runs, reverse=False, dedup=False, caseSensitive=False, offset=0 ):
+    ## LINE OPERATIONS
+    # k-way merge of sorted runs of (key, line) pairs; duplicates always share the same
+    # sort key, so deduplicating each group of equal keys keeps the same lines as deduping
+    # before sorting would
+    merged = heapMerge(*runs, key=itemgetter(0), reverse=reverse)
+    if (not dedup):
+        for key, line in merged: yield line
+        return
+    for key, group in groupby(merged, key=itemgetter(0)):
+        group = [line for key, line in group]
+        if (len(group) == 1): yield group[0]
+        elif (not reverse): yield from _dedupedLines(group, caseSensitive, offset=offset)
+        else: yield from reversed(_dedupedLines(group[::-1], caseSensitive, offset=offset))
 
+def _mergedRuns( runs, sortKey, reverse=False, dedup=False, caseSensitive=False, offset=0 ):
+    ## LINE OPERATIONS
+    # k-way merge of _sortedRuns()
+    runs = [((sortKey(line[:-1]), line[:-1]) for line in runFile) for runFile in runs]
+    return _mergedSortedPairs(runs, reverse, dedup, caseSensitive, offset)
 
-def sortLines( document, reverse=False, dedup=False, caseSensitive=False, offset=0 ):
+def _parallelSortedLines( lines, reverse=False, dedup=False, caseSensitive=False, offset=0,
+                          mode=r'Text', delimiter=None, columns=() ):
+    ## LINE OPERATIONS
+    # partitions are sorted by worker processes, then merged (and deduped) here
+    sortArguments = (mode, caseSensitive, offset, delimiter, columns)
+    with SharedLines(lines, workerCount()) as shared:
+        with processPool(len(shared.partitions)) as pool:
+            runs = list(pool.map(_sortedPartition, shared.partitions,
+                                 repeat(reverse), repeat(sortArguments)))
+    if (reverse): runs.reverse()
+    return _mergedSortedPairs(runs, reverse, dedup, caseSensitive, offset)
+
+def _sortKeyFunction( mode=r'Text', caseSensitive=False, offset=0, delimiter=None, columns=() ):
+    ## LINE OPERATIONS
+    return lambda line: _sortKeys((line,), mode, caseSensitive, offset, delimiter, columns)[0]
+
+def sortLines( document, reverse=False, dedup=False, caseSensitive=False, offset=0,
+               mode=r'Text', delimiter=None, columns=(), external=None ):
     ## LINE OPERATIONS
     beg, end, noneSelected = getSelectedLines(document)
-    selection = document.get_text(beg, end, False).splitlines()
-    if (dedup): selection = _dedupedLines(selection, caseSensitive, offset)
-    if (not caseSensitive):
-        sortKey = lambda x: re.sub(r'\s+', r'', x[offset:].casefold())
+    if (external is None):
+        external = ((end.get_offset() - beg.get_offset()) > externalSortThreshold)
+    if (external): # bounded memory: sorted runs on disk, merged back into the buffer
+        sortKey = _sortKeyFunction(mode, caseSensitive, offset, delimiter, columns)
+        runs = _sortedRuns(linesOf(document, beg, end), sortKey, reverse)
+        def closeRuns( applied ):
+            for runFile in runs: runFile.close()
+        applyLines(document, beg, end,
+                   _mergedRuns(runs, sortKey, reverse, dedup, caseSensitive, offset), closeRuns)
+        return
+    selection = list(linesOf(document, beg, end))
+    sortedSelection = None
+    if (worthParallelizing(len(selection))):
+        try:
+            sortedSelection = list(_parallelSortedLines(selection, reverse, dedup, caseSensitive,
+                                                        offset, mode, delimiter, columns))
+        except:
+            pass # no workers (e.g. a broken pool), so done right here instead
+    if (sortedSelection is not None):
+        selection = sortedSelection
     else:
-        sortKey = lambda x: re.sub(r'\s+', r'', x[offset:])
-    selection = sorted(selection, key=sortKey)
-    if (reverse): selection = reversed(selection)
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor('\n'.join(selection))
-    document.end_user_action()
+        if (dedup): selection = _dedupedLines(selection, caseSensitive, offset=offset)
+        sortKeys = _sortKeys(selection, mode, caseSensitive, offset, delimiter, columns)
+        selection = [selection[i] for i in sorted(range(len(selection)), key=sortKeys.__getitem__)]
+        if (reverse): selection.reverse()
+    applyLines(document, beg, end, selection)
 
 
 
 def _commentedSpecialCaseLine( line, language, cursorOffset ):
     ## COMMENT/UNCOMMENT
-    if ((language == r'cobol') and (line[6] != r'*')):
+    if ((language == r'cobol') and (line[6:7] != r'*')):
         line = (line[:6], line[6:])
         if (line[1].startswith(r' ')):
             if (cursorOffset >= len(line[0])): cursorOffset += 1
@@ -259,18 +738,17 @@ def _commentedSpecialCaseLine( line, language, cursorOffset ):
         return ((r'C ' + line), (cursorOffset + 2))
     return (line, cursorOffset)
 
-def _commentedLine( line, language, preferHashComment=False, cursorOffset=0 ):
+def _commentedLine( line, codec, preferHashComment=False, cursorOffset=0 ):
     ## COMMENT/UNCOMMENT
     if (len(line) > 3): line = [line[0], line[-2], line[-1]]
     if (len(line[1]) == 0): return (''.join(line), cursorOffset)
     space = r' ' if not line[1].startswith(r' ') else r''
     indentationLength = len(line[0])
-    if (language in commentSymbol[r'line']):
-        hasAltHashComment = language in commentSymbol[r'line#']
-        startOfComment = commentSymbol[r'line'][language]
-        if (hasAltHashComment):
+    if (codec.lineStart is not None):
+        startOfComment = codec.lineStart
+        if (codec.hashAlternative):
             if (preferHashComment): startOfComment = r'#'
-            possibleStartsOfComment = (commentSymbol[r'line'][language], r'#')
+            possibleStartsOfComment = (codec.lineStart, r'#')
         else:
             possibleStartsOfComment = (startOfComment)
         if (line[1].startswith(possibleStartsOfComment)):
@@ -278,8 +756,8 @@ def _commentedLine( line, language, preferHashComment=False, cursorOffset=0 ):
         if (cursorOffset >= indentationLength):
             cursorOffset += (len(startOfComment) + len(space))
         line = line[0] + startOfComment + space + line[1] + line[2]
-    elif (language in commentSymbol[r'block']):
-        limits = commentSymbol[r'block'][language]
+    elif (codec.block is not None):
+        limits = codec.block
         if (line[1].startswith(limits[0])): return (r''.join(line), cursorOffset)
         if (cursorOffset >= indentationLength):
             if (cursorOffset >= (indentationLength + len(line[1]))):
@@ -288,99 +766,128 @@ def _commentedLine( line, language, preferHashComment=False, cursorOffset=0 ):
         line = line[0] + limits[0] + space + line[1] + r' ' + limits[1] + line[2]
     else:
         line = r''.join(line)
-        if (language in commentSymbol[r'special']):
-            return _commentedSpecialCaseLine(line, language, cursorOffset)
+        if (codec.special): return _commentedSpecialCaseLine(line, codec.language, cursorOffset)
     return (line, cursorOffset)
 
+def _commentedLines( lines, codec, preferHashComment=False ):
+    ## COMMENT/UNCOMMENT
+    lineParts = _lineParts.match
+    return [_commentedLine(lineParts(line).groups(), codec, preferHashComment)[0] for line in lines]
+
 def commentLines( document ):
     ## COMMENT/UNCOMMENT
+    if (isBeingApplied(document)): return
     beg, end, noneSelected = getSelectedLines(document, False)
+    codec = commentCodec(document)
+    if (codec.isUseless): return
     selection = document.get_text(beg, end, False)
     if (noneSelected and _emptyLine.match(selection)): return
-    language = cleanLanguageName(document.get_language().get_name())
-    lineParts = re.compile(r'^([\t ]*)(.*?)(\s*)$')
     document.begin_user_action()
     document.delete(beg, end)
     if (noneSelected):
         line = document.get_iter_at_mark(document.get_insert())
         column = line.get_line_offset()
         line = line.get_line()
-        selection = lineParts.search(selection).groups()
-        selection = [(r'' if part is None else part) for part in selection]
-        selection, column = _commentedLine(selection, language, False, column) #TODO: preferHash~
+        selection = _lineParts.match(selection).groups()
+        selection, column = _commentedLine(selection, codec, False, column) #TODO: preferHash~
         document.insert_at_cursor(selection)
         document.place_cursor(document.get_iter_at_line_offset(line, column))
     else:
-        selection = [lineParts.search(line).groups() for line in selection.splitlines()]
-        selection = [[(r'' if part is None else part) for part in line] for line in selection]
-        selection = [_commentedLine(line, language, False)[0] for line in selection] #TODO: preferHash~
+        selection = _commentedLines(selection.splitlines(), codec, False) #TODO: preferHash~
         document.insert_at_cursor('\n'.join(selection))
     document.end_user_action()
 
 def _uncommentedSpecialCaseLine( line, language, cursorOffset ):
     ## COMMENT/UNCOMMENT
-    if ((language == r'cobol') and (line[6] == r'*')):
+    if ((language == r'cobol') and (line[6:7] == r'*')):
         line = line[:6] + line[7:]
-        return (line, (lineOffset - (lineOffset > 5)))
+        return (line, (cursorOffset - (cursorOffset > 5)))
     elif((language == r'fortran77') and line.startswith((r'C', r'c'))):
         if (line.startswith(r' ')): return ((r'C' + line), (cursorOffset + 1))
         return (line[1:], (cursorOffset - 1))
     return (line, cursorOffset)
 
-def _uncommentedLine( line, language, cursorOffset=0 ):
+def _uncommentedLine( line, codec, cursorOffset=0 ):
     ## COMMENT/UNCOMMENT
-    limits = None
     if (_emptyLine.match(line)): return (line, cursorOffset)
-    if (language in commentSymbol[r'line']):
-        limits = (commentSymbol[r'line'][language], r'')
-        start = r'(' + re.escape(limits[0]) + r'+)'
-        if (language in commentSymbol[r'line#']): start = start[:-1] + r'|#+)'
-        commentedLine = re.compile(r'^\s*' + start)
-    elif (language in commentSymbol[r'block']):
-        limits = commentSymbol[r'block'][language]
-        start = r'(' + re.escape(limits[0]) + r')'
-        commentedLine = re.compile(r'^\s*' + start + r'.*' + re.escape(limits[1][0]))
-    elif(language in commentSymbol[r'special']):
-        line, cursorOffset = _uncommentedSpecialCaseLine(line, language, cursorOffset)
-    if ((limits is not None) and commentedLine.match(line)):
+    if (codec.special): return _uncommentedSpecialCaseLine(line, codec.language, cursorOffset)
+    if ((codec.limits is not None) and codec.commented.match(line)):
+        limits = codec.limits
         finalOffset = cursorOffset
-        line = line.rsplit(limits[1], 1) if (len(limits[1]) > 0) else [line, r'']
-        line = [re.sub(r'[\t ]+$', r'', line[0]), line[1]]
+        line = line.rsplit(limits[1], 1) if (len(limits[1]) > 0) else [line]
+        line = [line[0].rstrip('\t '), (line[1] if (len(line) > 1) else r'')]
         if (cursorOffset > len(line[0])): finalOffset -= len(limits[1])
-        firstPartLength = len(line[0])
-        line = re.split((start + r'\s*'), line[0], 1) + [line[1]]
+        line = codec.startOfComment.split(line[0], 1) + [line[1]]
         if (cursorOffset > len(line[0])): finalOffset -= len(line[1])
         return (r''.join([line[0], line[2], line[3]]), finalOffset)
     return (line, cursorOffset)
 
+def _uncommentedLines( lines, codec ):
+    ## COMMENT/UNCOMMENT
+    return [_uncommentedLine(line, codec)[0] for line in lines]
+
 def uncommentLines( document ):
     ## COMMENT/UNCOMMENT
+    if (isBeingApplied(document)): return
     beg, end, noneSelected = getSelectedLines(document, False)
+    codec = commentCodec(document)
+    if (codec.isUseless): return
     selection = document.get_text(beg, end, False)
     if (noneSelected and _emptyLine.match(selection)): return
-    language = cleanLanguageName(document.get_language().get_name())
     document.begin_user_action()
     document.delete(beg, end)
     if (noneSelected):
         line = document.get_iter_at_mark(document.get_insert())
         column = line.get_line_offset()
         line = line.get_line()
-        selection, column = _uncommentedLine(selection, language, column)
+        selection, column = _uncommentedLine(selection, codec, column)
         document.insert_at_cursor(selection)
         document.place_cursor(document.get_iter_at_line_offset(line, column))
     else:
-        selection = selection.splitlines()
-        selection = [_uncommentedLine(line, language)[0] for line in selection]
+        selection = _uncommentedLines(selection.splitlines(), codec)
         document.insert_at_cursor('\n'.join(selection))
     document.end_user_action()
 
 
 
+_htmlEncodingTable = None
+# names are looked up afterwards: a regex listing them all is about twice as slow
+_htmlEntity = re.compile(r'&(?:#[0-9]{1,7}|#[xX][0-9A-Fa-f]{1,6}|[A-Za-z][A-Za-z0-9]{1,7});')
+_longestHTMLEntity = 10 # characters, as in '&#x10FFFF;'
+
+def _htmlEncodingTableOf():
+    # str.translate() table from what has a named entity to it; built once, on first use
+    global _htmlEncodingTable
+    if (_htmlEncodingTable is None):
+        table = {codepoint:codepoint for codepoint in range(128)} # hits are much faster than misses
+        table.update({codepoint:(r'&' + name + r';') for codepoint, name in codepoint2html.items()})
+        _htmlEncodingTable = table
+    return _htmlEncodingTable
+
+def _entityAlignedChunks( chunks ):
+    # 'chunks' cut again, so that none ends in the middle of an entity
+    carried = r''
+    for chunk in chunks:
+        text = carried + chunk
+        cut = text.rfind(r'&', max(0, (len(text) - _longestHTMLEntity)))
+        if ((cut >= 0) and (text.find(r';', cut) < 0)): text, carried = (text[:cut], text[cut:])
+        else: carried = r''
+        yield text
+    yield carried
+
 def htmlEncode( document ):
     ## ENCODING STUFF
-    beg, end, noneSelected = getSelection(document, False)
-    selection = document.get_text(beg, end, False)
-    #TODO
+    beg, end, noneSelected = getSelection(document)
+    table = _htmlEncodingTableOf()
+    selection = [chunk.translate(table) for chunk in chunksOf(document, beg, end)]
+    applyPieces(document, beg, end, selection)
+
+def htmlDecode( document ):
+    ## ENCODING STUFF
+    beg, end, noneSelected = getSelection(document)
+    selection = [_htmlEntity.sub(_htmlDecodedEntity, chunk)
+                 for chunk in _entityAlignedChunks(chunksOf(document, beg, end))]
+    applyPieces(document, beg, end, selection)
 
 
 
@@ -388,85 +895,402 @@ def htmlEncode( document ):
 def percentEncode( document, doNotEncode=r'' ):
     ## ENCODING STUFF
     beg, end, noneSelected = getSelection(document, False)
-    selection = document.get_text(beg, end, False)
     if (noneSelected):
         default = r'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~'
-        if (selection in default): return
+        if (document.get_text(beg, end, False) in default): return
     doNotEncode = doNotEncode.replace(r'%', r'')
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor(urlquote(selection, doNotEncode, r'utf-8', r'ignore'))
-    document.end_user_action()
+    selection = [urlquote(chunk, doNotEncode, r'utf-8', r'ignore')
+                 for chunk in chunksOf(document, beg, end)]
+    applyPieces(document, beg, end, selection)
 
 
 
 def percentDecode( document ):
     ## ENCODING STUFF
     beg, end, noneSelected = getSelection(document, False)
-    if (noneSelected): end.forward_chars(2)
-    selection = document.get_text(beg, end, False)
-    if (noneSelected and (not re.match(r'^%[0-9A-Fa-f][0-9A-Fa-f]$', selection))): return
-    document.begin_user_action()
-    document.delete(beg, end)
-    document.insert_at_cursor(urlunquote(selection, r'utf-8', r'replace'))
-    document.end_user_action()
+    if (noneSelected):
+        end.forward_chars(2)
+        if (not re.match(r'^%[0-9A-Fa-f][0-9A-Fa-f]$', document.get_text(beg, end, False))): return
+    # escapes never span lines, so line-aligned slices never split one
+    selection = [urlunquote(text, r'utf-8', r'replace')
+                 for offset, text in _lineSlices(document, beg, end)]
+    applyPieces(document, beg, end, selection)
+
+
 
+defaultDetectionConfidence = 0.9
+_detectionBudgets = (65536, 524288, 4194304) # characters sampled, until confident enough
 
+def detectionConfidence():
+    # confidence from which encoding detection stops sampling more of the document
+    try:
+        settings = Gio.Settings.new(r'org.gnome.gedit.plugins.metagedit')
+        return settings.get_value(r'encoding-detection-confidence').get_double()
+    except:
+        return defaultDetectionConfidence
+
+def _sampleWindows( length, budget ):
+    # about 'budget' characters out of 'length': the head, the tail and 8 windows in between
+    # (always the same ones for the same length)
+    if (length <= budget): return [(0, length)]
+    quarter, windowSize = ((budget // 4), (budget // 16))
+    middle = Random(length).sample(range(quarter, (length - quarter - windowSize)), 8)
+    windows = [(0, quarter)] + [(start, (start + windowSize)) for start in sorted(middle)]
+    windows.append(((length - quarter), length))
+    return windows
+
+def _newSampleRanges( length, budget, covered ):
+    # the parts of _sampleWindows() not in 'covered' (sorted, disjoint ranges already
+    # sampled), which also gets them added
+    ranges = []
+    for start, stop in _sampleWindows(length, budget):
+        pieces = []
+        for coveredStart, coveredStop in covered:
+            if (coveredStop <= start): continue
+            if (coveredStart >= stop): break
+            if (coveredStart > start): pieces.append((start, coveredStart))
+            start = coveredStop
+        if (start < stop): pieces.append((start, stop))
+        ranges += pieces
+        merged = []
+        for start, stop in sorted(covered + pieces):
+            if ((len(merged) > 0) and (start <= merged[-1][1])):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        covered[:] = merged
+    return ranges
+
+def _documentText( document, start, stop ):
+    return document.get_text(document.get_iter_at_offset(start), document.get_iter_at_offset(stop), False)
+
+def _sampleSteps( document ):
+    # for each of _detectionBudgets (up to the first one covering the whole document), the
+    # texts it adds to the samples of the ones before
+    length, covered = (document.get_char_count(), [])
+    for budget in _detectionBudgets:
+        ranges = _newSampleRanges(length, budget, covered)
+        yield (_documentText(document, start, stop) for start, stop in ranges)
+        if (length <= budget): break
+
+def _encodedSamples( document, encoding, budget ):
+    # the document's _sampleWindows(), each encoded on its own
+    for start, stop in _sampleWindows(document.get_char_count(), budget):
+        yield _documentText(document, start, stop).encode(encoding, r'ignore')
+
+def _savedPath( document ):
+    # path of the document's file, if it's local and the document is unchanged from it
+    location = document.get_file().get_location()
+    if ((location is None) or document.get_modified()): return None
+    return location.get_path()
+
+def _documentFileIdentity( document, path ):
+    # fileIdentity() of the document's file, worked out once after it's loaded or saved
+    known = getattr(document, r'metageditFileIdentity', None)
+    if ((known is None) or (known[0] != path)):
+        known = document.metageditFileIdentity = (path, fileIdentity(path))
+    return known[1]
+
+def forgetFileIdentity( document ):
+    ## ENCODING STUFF
+    # (for when the document was loaded or saved again)
+    if (hasattr(document, r'metageditFileIdentity')): delattr(document, r'metageditFileIdentity')
+
+def cachedDocumentEncoding( document ):
+    ## ENCODING STUFF
+    # a previous detectDocumentEncoding() for the document's file, if it hasn't changed
+    path = _savedPath(document)
+    if (path is None): return None
+    cached = encodingCache.get(path, _documentFileIdentity(document, path))
+    if (cached is None): return None
+    document.metageditEncodingDetection = (cached[0], cached[1], None)
+    return document.metageditEncodingDetection
+
+def _keepDetection( document, path, identity, detection ):
+    document.metageditEncodingDetection = detection
+    if ((path is not None) and (detection[0] is not None)):
+        encodingCache.put(path, detection[0], detection[1], identity)
+
+def detectDocumentEncoding( document, inUseEncoding, confidence=None ):
+    ## ENCODING STUFF
+    # chardet over growing samples of the document, as bytes in 'inUseEncoding' (each one
+    # only adding to the one before), until it's confident enough, a bigger sample says the
+    # same, or the document is all read; it's
+    # (encoding, confidence, bytes examined), also kept as 'metageditEncodingDetection';
+    # for unchanged files, detections are cached (and then, bytes examined is None)
+    cached = cachedDocumentEncoding(document)
+    if (cached is not None): return cached
+    path = _savedPath(document)
+    if (confidence is None): confidence = detectionConfidence()
+    detection = _detectedEncoding(_sampleSteps(document), inUseEncoding, confidence)
+    _keepDetection(document, path, (_documentFileIdentity(document, path) if path else None), detection)
+    return detection
+
+def submitEncodingDetection( document, inUseEncoding, executor, whenDetected, confidence=None ):
+    ## ENCODING STUFF
+    # detectDocumentEncoding() without waiting for it: chardet runs in 'executor', the samples
+    # of the first budget are read beforehand, and those of each further one it turns out to
+    # need are read by the main loop when asked for; whenDetected(detection) is called from
+    # the main loop too (right away, if it was cached)
+    cached = cachedDocumentEncoding(document)
+    if (cached is not None): return whenDetected(cached)
+    path = _savedPath(document)
+    identity = _documentFileIdentity(document, path) if (path is not None) else None
+    if (confidence is None): confidence = detectionConfidence()
+    sampleSteps = _sampleSteps(document)
+    firstStep = list(next(sampleSteps))
+    def readStep( fetched ):
+        try: fetched.put(list(next(sampleSteps)))
+        except: fetched.put(None) # no more budgets
+        return False
+    def steps():
+        yield firstStep
+        fetched = Queue()
+        while True:
+            GLib.idle_add(readStep, fetched)
+            # (without a main loop, e.g. when quitting, there are no more samples)
+            try: samples = fetched.get(timeout=10)
+            except Empty: return
+            if (samples is None): return
+            yield samples
+    def detected( detection ):
+        _keepDetection(document, path, identity, detection)
+        whenDetected(detection)
+        return False
+    def detect():
+        try: detection = _detectedEncoding(steps(), inUseEncoding, confidence)
+        except: detection = (None, 0, 0)
+        GLib.idle_add(detected, detection)
+    executor.submit(detect)
+
+def inUseEncoding( document ):
+    ## ENCODING STUFF
+    return codecLookup(document.get_file().get_encoding().get_charset()).name
+
+def ASCIITransliterated( text ):
+    ## ENCODING STUFF
+    # what has an ASCII look-alike (or transliteration) replaced by it (see ASCIITable()), and
+    # combining marks dropped; the rest is kept as it is
+    if (text.isascii()): return text
+    capitalized, allCaps = ASCIIAllCaps()
+    def inCapitals( match ):
+        # e.g. 'Щ' is 'Shch' in 'Щука', but 'SHCH' in 'ЩУКА' and 'БОРЩ'
+        after = text[match.end():(match.end() + 1)]
+        before = text[max(0, (match.start() - 1)):match.start()]
+        if (after.isupper() or ((not after.isalpha()) and before.isupper())):
+            return allCaps[match.group()]
+        return match.group()
+    return capitalized.sub(inCapitals, text).translate(ASCIITable())
+
+def redecodedText( text, inUseEncoding, actualEncoding, forceASCIIMode=False ):
+    ## ENCODING STUFF
+    text = text.encode(inUseEncoding, r'ignore').decode(actualEncoding, r'replace')
+    if (forceASCIIMode): text = ASCIITransliterated(text)
+    return text
+
+def _redecodedPieces( chunks, inUseEncoding, actualEncoding, forceASCIIMode=False ):
+    # redecodedText() for a piece at a time (multi-byte characters may span pieces)
+    decoder = getIncrementalDecoder(actualEncoding)(r'replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk.encode(inUseEncoding, r'ignore'))
+        yield (ASCIITransliterated(text) if forceASCIIMode else text)
+    text = decoder.decode(b'', True)
+    yield (ASCIITransliterated(text) if forceASCIIMode else text)
+
+def encodingSample( document, size=(1024 * 1024) ):
+    ## ENCODING STUFF
+    # about 'size' characters of the document (see _encodedSamples()), as they were in its file
+    return b''.join(_encodedSamples(document, inUseEncoding(document), size))
+
+def _encodingsCodecs( encodings ):
+    ## ENCODING STUFF
+    # the codec of each of 'encodings' (None if unknown), and each codec once
+    codecs = []
+    for encoding in encodings:
+        try: codecs.append(codecName(encoding))
+        except: codecs.append(None)
+    return (codecs, list(dict.fromkeys(c for c in codecs if (c is not None))))
+
+def _encodingsByPenalty( encodings, codecs, penalties ):
+    ## ENCODING STUFF
+    penalties[None] = None
+    unusable = float(r'inf')
+    order = sorted(range(len(encodings)), key=lambda i: (unusable if (penalties[codecs[i]] is None)
+                                                         else penalties[codecs[i]]))
+    return [encodings[i] for i in order]
+
+def rankEncodings( sample, encodings, languageISO6392=r'mul' ):
+    ## ENCODING STUFF
+    # 'encodings' from the most to the least fitting for 'sample' (each codec is scored once,
+    # in parallel); the ones which can't decode anything at all go last
+    codecs, distinctCodecs = _encodingsCodecs(encodings)
+    letters = scriptLetters(languageISO6392)
+    penalties = dict()
+    if (len(distinctCodecs) > 0):
+        with SharedBytes(sample) as shared:
+            with processPool(min(workerCount(), len(distinctCodecs))) as pool:
+                penalties.update(zip(distinctCodecs,
+                                     pool.map(_encodingPenalty, repeat((shared.name, 0, shared.size)),
+                                              distinctCodecs, repeat(letters))))
+    return _encodingsByPenalty(encodings, codecs, penalties)
+
+def submitEncodingRanking( sample, encodings, languageISO6392, whenRanked ):
+    ## ENCODING STUFF
+    # rankEncodings() without waiting for it: the codecs are submitted to the workers from
+    # the calling thread, and whenRanked(ranked encodings, or None if it failed) is called
+    # from the one collecting their results
+    codecs, distinctCodecs = _encodingsCodecs(encodings)
+    if (len(distinctCodecs) == 0): return whenRanked(list(encodings))
+    letters = scriptLetters(languageISO6392)
+    shared = SharedBytes(sample)
+    try: pool = processPool(min(workerCount(), len(distinctCodecs)))
+    except:
+        shared.close()
+        raise
+    futures = [pool.submit(_encodingPenalty, (shared.name, 0, shared.size), codec, letters)
+               for codec in distinctCodecs]
+    remaining, lock = ([len(futures)], Lock())
+    def collected( future ):
+        with lock:
+            remaining[0] -= 1
+            if (remaining[0] > 0): return
+        shared.close()
+        pool.shutdown(wait=False)
+        try:
+            penalties = dict(zip(distinctCodecs, [future.result() for future in futures]))
+            ranked = _encodingsByPenalty(encodings, codecs, penalties)
+        except:
+            ranked = None
+        whenRanked(ranked)
+    for future in futures: future.add_done_callback(collected)
 
 def redecode( document, actualEncoding=r'Autodetect', forceASCIIMode=False ):
     ## ENCODING STUFF
-    actualEncoding = actualEncoding.strip().replace(r' ', r'_').lower()
-    actualEncoding = re.sub(r'^(code[-_]?page|windows)[-_]?', r'cp', actualEncoding)
-    actualEncoding = re.sub(r'^mac[-_]?os[-_]?', r'mac', actualEncoding)
-    auto = (actualEncoding == r'autodetect')
+    auto = (actualEncoding.strip().lower() == r'autodetect')
     try:
-        inUseEncoding = codecLookup(document.get_file().get_encoding().get_charset()).name
-        actualEncoding = None if auto else codecLookup(actualEncoding).name
-        if (inUseEncoding == actualEncoding): return
-        text = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
-        text = text.encode(inUseEncoding, r'ignore')
+        inUse = inUseEncoding(document)
+        actualEncoding = None if auto else codecName(actualEncoding)
+        if ((inUse == actualEncoding) and (not forceASCIIMode)): return
         if (auto):
-            actualEncoding = codecLookup(detectEncoding(text)[r'encoding']).name
-            if (inUseEncoding == actualEncoding): return #TODO: do this even if not 'auto'
+            actualEncoding = codecLookup(detectDocumentEncoding(document, inUse)[0]).name
+            if ((inUse == actualEncoding) and (not forceASCIIMode)): return #TODO: do this even if not 'auto'
+        beg, end = document.get_bounds()
+        pieces = list(_redecodedPieces(chunksOf(document, beg, end), inUse, actualEncoding,
+                                       forceASCIIMode))
     except:
         return
-    text = text.decode(actualEncoding, r'replace')
-    if (forceASCIIMode):
-        text = unicodeNormalize(r'NFKD', text)
-        text = r''.join([c for c in text if not unicodeCombining(c)])
-    document.begin_user_action()
-    document.delete(document.get_start_iter(), document.get_end_iter())
-    try:
-        document.insert(document.get_end_iter(), text)
-        document.end_user_action()
-    except:
-        document.end_user_action()
-        document.undo()
+    applyPieces(document, document.get_start_iter(), document.get_end_iter(), pieces)
+
+
+
+## TRANSLATE
+translationWorkers = 8 # chunks being translated at the same time
+_translationChunkSize = 14000 # characters
+_paragraphBreak = re.compile(r'\n[\t ]*\n\s*')
+_sentenceBreak = re.compile(r'[.!?;\u3002\uFF01\uFF1F][\'")\]\u2019\u201D]*\s+|\n\s*')
+_wordBreak = re.compile(r'\s+')
+_surroundingSpaces = re.compile(r'^(\s*)(.*?)(\s*)$', re.DOTALL)
+
+def _translationChunks( text, chunkSize=_translationChunkSize ):
+    # 'text' in pieces of up to 'chunkSize' characters, each cut after a paragraph or, if
+    # none ends late enough in it, after a sentence or a word (or, as a last resort, anywhere)
+    beg = 0
+    while ((len(text) - beg) > chunkSize):
+        window = text[beg:(beg + chunkSize)]
+        cut = chunkSize
+        for boundary in (_paragraphBreak, _sentenceBreak, _wordBreak):
+            ends = [match.end() for match in boundary.finditer(window, (chunkSize // 2))]
+            if (len(ends) > 0):
+                cut = ends[-1]
+                break
+        yield window[:cut]
+        beg += cut
+    yield text[beg:]
+
+def _translatedChunk( chunk, to, translated, memory ):
+    # runs in a worker thread
+    translation = translated(chunk, to)
+    if (memory is not None): memory.put(chunk, to, translation)
+    return translation
+
+def _chunkTranslations( text, to, translated, translators, memory=None ):
+    # (spaces before, future translation, spaces after) for each chunk of 'text': the chunks
+    # in 'memory' (see TranslationMemory) are already done, the others are submitted to the
+    # 'translators' pool (once, however many times they're repeated)
+    from concurrent.futures import Future
+    translations, submitted = ([], dict())
+    for chunk in _translationChunks(text):
+        before, chunk, after = _surroundingSpaces.match(chunk).groups()
+        future = submitted.get(chunk)
+        if (future is None):
+            translation = chunk if (len(chunk) == 0) else None
+            if ((translation is None) and (memory is not None)): translation = memory.get(chunk, to)
+            if (translation is None):
+                future = translators.submit(_translatedChunk, chunk, to, translated, memory)
+            else:
+                future = Future()
+                future.set_result(translation)
+            submitted[chunk] = future
+        translations.append((before, future, after))
+    return translations
+
+def _translatedPieces( translations ):
+    # the translated chunks, in order, each as soon as it (and the ones before it) arrived
+    for before, future, after in translations:
+        while (not future.done()): yield pending
+        yield r''.join((before, future.result(), after))
 
+if (translationIsAvailable):
 
+    _translators = threadLocal() # one translator per worker thread
+    _googletrans = None # the module once imported, False if importing it failed
 
-if (translationIsAvailable):
+    def _importedGoogletrans():
+        # an installed googletrans may still fail to import (e.g. with a newer httpcore)
+        global _googletrans
+        if (_googletrans is None):
+            try:
+                import googletrans
+                _googletrans = googletrans
+            except:
+                _googletrans = False
+        return _googletrans
 
-    translatableLanguages = translatorLANGUAGES
+    def translationWorks():
+        return (_importedGoogletrans() is not False)
 
-    def translate( document, to ):
+    def warmTranslation():
+        ## TRANSLATE
+        # googletrans gets imported by a background thread (e.g. once gedit is up), so that
+        # the first context menu doesn't wait for it
+        Thread(target=_importedGoogletrans, daemon=True).start()
+        return False
+
+    def translatableLanguages():
+        googletrans = _importedGoogletrans()
+        return googletrans.LANGUAGES if googletrans else dict()
+
+    def _googleTranslated( text, to ):
+        googletrans = _importedGoogletrans()
+        if (not googletrans): raise ImportError(r'googletrans could not be imported')
+        if (not hasattr(_translators, r'translator')): _translators.translator = googletrans.Translator()
+        return _translators.translator.translate(text, src=r'auto', dest=to).text
+
+    def translate( document, to, translated=None ):
         ## TRANSLATE
+        # chunks are translated by 'translated' (text, language) in parallel (unless they
+        # were before), and replace the text as they arrive; if any fails, all is rolled back
+        from concurrent.futures import ThreadPoolExecutor
         beg, end, noneSelected = getSelection(document)
         if (noneSelected and (document.get_language() is not None)): return
+        if (isBeingApplied(document)): return
+        if (translated is None): translated = _googleTranslated
         selection = document.get_text(beg, end, False)
-        selection = textWrap(selection, 14000,
-                expand_tabs=False, replace_whitespace=False, drop_whitespace=False)
-        translator = Translator()
-        result = r''
-        try:
-            for chunk in selection:
-                result += translator.translate(chunk, src=r'auto', dest=to).text
-        except:
-            return
-        document.begin_user_action()
-        document.delete(beg, end)
-        document.insert_at_cursor(result)
-        document.end_user_action()
+        translators = ThreadPoolExecutor(max_workers=translationWorkers)
+        translations = _chunkTranslations(selection, to, translated, translators, translationMemory)
+        translators.submit(translationMemory.flush) # the hits above, off the main thread
+        BufferApplier(document, beg, end, _translatedPieces(translations), len(selection),
+                      lambda applied: translators.shutdown(wait=False, cancel_futures=True))
 else:
 
     def translate( document, to ):
@@ -0,0 +1,170 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+
+import re
+from codecs import lookup as codecLookup
+from hashlib import blake2b
+
+from .parallel import sharedLines, sharedBytes
+
+
+
+# what worker processes run (see processPool()), and the like: they import this module, so
+# it must only import the standard library and gi-free modules of the plugin (gedit's
+# typelib can only be found from within gedit)
+
+_emptyLine = re.compile(r'^\s*$')
+
+## LINE OPERATIONS
+_number = re.compile(r'\s*([-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:e[-+]?[0-9]+)?)', re.IGNORECASE)
+_digits = re.compile(r'([0-9]+)')
+_version = re.compile(r'\s*v?([0-9]+(?:\.[0-9]+)*)(?:-([0-9a-z.-]+))?', re.IGNORECASE)
+
+## ENCODING STUFF
+_controlCharacters = re.compile(r'[\x00-\x08\x0B\x0E-\x1F\x7F-\x9F]')
+_allButNonASCIILetters = re.compile(r'[\W\d_\x00-\x7F]+')
+_scriptFitStride = 8 # letters are classified on one of each that many characters only
+
+
+
+def _lineDigest( line, digestSize=16 ):
+    ## LINE OPERATIONS
+    digest = blake2b(line.encode(r'utf-8', r'surrogatepass'), digest_size=digestSize).digest()
+    digest = int.from_bytes(digest, r'little')
+    return (digest & 0xFFFFFFFFFFFFFFFF, digest >> 64)
+
+def _dedupedPartition( partition, caseSensitive, KeepEmptyOnes, offset ):
+    ## LINE OPERATIONS
+    # runs in a worker process: first occurrences within the partition, with their digests
+    kept, seen = ([], set())
+    for i, line in enumerate(sharedLines(*partition)):
+        line_ = line[offset:] if caseSensitive else line[offset:].casefold()
+        if (KeepEmptyOnes and _emptyLine.match(line_)):
+            kept.append((i, None))
+        elif (line_ not in seen):
+            seen.add(line_)
+            kept.append((i, _lineDigest(line_)))
+    return kept
+
+def _sortedPartition( partition, reverse, sortArguments ):
+    ## LINE OPERATIONS
+    # runs in a worker process; sorted like _sortedRuns() does with its runs
+    lines = sharedLines(*partition)
+    if (reverse): lines.reverse()
+    keys = _sortKeys(lines, *sortArguments)
+    order = sorted(range(len(lines)), key=keys.__getitem__, reverse=reverse)
+    return [(keys[i], lines[i]) for i in order]
+
+def _numberKey( text ):
+    ## LINE OPERATIONS
+    number = _number.match(text)
+    if (number is None): return (1, r''.join(text.split()))
+    return (0, float(number.group(1)))
+
+def _naturalKey( text ):
+    ## LINE OPERATIONS
+    parts = _digits.split(r''.join(text.split()))
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return tuple(parts)
+
+def _versionKey( text ):
+    ## LINE OPERATIONS
+    version = _version.match(text)
+    if (version is None): return (1, r''.join(text.split()))
+    release = tuple([int(part) for part in version.group(1).split(r'.')])
+    if (version.group(2) is None): return (0, release, (1,)) # releases after pre-releases
+    preRelease = tuple([((0, int(part), r'') if part.isdigit() else (1, 0, part))
+                        for part in version.group(2).split(r'.')])
+    return (0, release, (0, preRelease))
+
+def _sortKeys( lines, mode=r'Text', caseSensitive=False, offset=0, delimiter=None, columns=() ):
+    ## LINE OPERATIONS
+    # all keys are built in one go, as plain strings or tuples of ints/strings; whitespace
+    # is dropped with str.split(), which splits on the very same characters as r'\s'
+    if (len(columns) == 0):
+        if (mode == r'Text'):
+            if (caseSensitive): return [r''.join(line[offset:].split()) for line in lines]
+            return [r''.join(line[offset:].casefold().split()) for line in lines]
+        keyOf = {r'Numbers':_numberKey, r'Natural':_naturalKey, r'Versions':_versionKey}[mode]
+        if (caseSensitive): return [keyOf(line[offset:]) for line in lines]
+        return [keyOf(line[offset:].casefold()) for line in lines]
+    keyOf = {r'Text':(lambda x: r''.join(x.split())), r'Numbers':_numberKey,
+             r'Natural':_naturalKey, r'Versions':_versionKey}[mode]
+    columns = [(column - 1) for column in columns]
+    keys = []
+    for line in lines:
+        fields = line[offset:] if caseSensitive else line[offset:].casefold()
+        fields = fields.split(delimiter)
+        keys.append(tuple([keyOf(fields[column] if (column < len(fields)) else r'')
+                           for column in columns]))
+    return keys
+
+
+
+def codecName( encoding ):
+    ## ENCODING STUFF
+    # Python's name for an encoding (as listed by supportedEncodings())
+    encoding = encoding.strip().replace(r' ', r'_').lower()
+    encoding = re.sub(r'^(code[-_]?page|windows)[-_]?', r'cp', encoding)
+    encoding = re.sub(r'^mac[-_]?os[-_]?', r'mac', encoding)
+    return codecLookup(encoding).name
+
+def _encodingPenalty( sample, encoding, letters ):
+    ## ENCODING STUFF
+    # runs in a worker process: the lower, the more like text the sample decodes to, going
+    # by the rate of replacement and control characters, of ASCII (the likes of spaces and
+    # line breaks are in most text), and of the non-ASCII letters not among 'letters'
+    try: text = sharedBytes(*sample).decode(codecName(encoding), r'replace')
+    except: return None
+    length = max(1, len(text))
+    penalty = (10 * text.count('\ufffd') / length)
+    penalty += (5 * len(_controlCharacters.findall(text)) / length)
+    penalty += max(0, (1 - (len(text.encode(r'ascii', r'ignore')) / (0.05 * length))))
+    if (letters is not None):
+        nonASCIILetters = _allButNonASCIILetters.sub(r'', text[::_scriptFitStride])
+        if (len(nonASCIILetters) > 0):
+            expectedLetters = re.sub((r'[^' + letters + r']+'), r'', nonASCIILetters)
+            penalty += 1 - (len(expectedLetters) / len(nonASCIILetters))
+    return penalty
+
+def _detectedEncoding( steps, inUseEncoding, confidence ):
+    # one chardet detector fed the sample texts of each of 'steps' in turn, until it's done,
+    # at least 'confidence' confident, or a step gets the same guess as the one before (which
+    # is what usually ends it, as chardet seldom gets that confident on single-byte encodings:
+    # chardet 7 stays around 0.2 for cp1251, however much it reads); as closing a detector is
+    # final, the guesses in between come from a copy of it; it only reads strings, so it can
+    # run in any thread
+    from copy import deepcopy
+    from chardet import UniversalDetector
+    detector, examined = (UniversalDetector(), 0)
+    result, previousEncoding = (None, None)
+    for samples in steps:
+        for sample in samples:
+            sample = sample.encode(inUseEncoding, r'ignore')
+            detector.feed(sample)
+            examined += len(sample)
+            if (detector.done): break
+        if (detector.done):
+            result = detector.close()
+            break
+        result = deepcopy(detector).close()
+        if ((result[r'confidence'] or 0) >= confidence): break
+        if ((result[r'encoding'] is not None) and (result[r'encoding'] == previousEncoding)): break
+        previousEncoding = result[r'encoding']
+    if (result is None): return (None, 0, 0)
+    return (result[r'encoding'], (result[r'confidence'] or 0), examined)
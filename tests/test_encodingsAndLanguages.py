@@ -0,0 +1,59 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 -m pytest tests
+
+import os
+import re
+import sys
+import html
+import types
+import importlib
+
+
+
+pluginFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), r'..', r'plugin', r'metagedit')
+
+def pluginModule( name ):
+    # (without running the plugin's __init__.py, which needs a running gedit)
+    if (r'metagedit' not in sys.modules):
+        package = types.ModuleType(r'metagedit')
+        package.__path__ = [os.path.normpath(pluginFolder)]
+        sys.modules[r'metagedit'] = package
+    return importlib.import_module(r'metagedit.' + name)
+
+encodingsAndLanguages = pluginModule(r'encodingsAndLanguages')
+
+
+
+def htmlDecoded( entity ):
+    return encodingsAndLanguages._htmlDecodedEntity(re.match(r'.*', entity))
+
+def test_numericEntitiesAsHtmlUnescape():
+    for codepoint in [*range(0x20000), *range(0x10FFF0, 0x110010)]:
+        for entity in ((r'&#%d;' % codepoint), (r'&#x%X;' % codepoint)):
+            assert (htmlDecoded(entity) == html.unescape(entity)), entity
+
+def test_C1EntitiesAsCp1252():
+    assert (htmlDecoded(r'&#128;') == '\u20AC')
+    assert (htmlDecoded(r'&#x93;') == '\u201C')
+    assert (htmlDecoded(r'&#129;') == '\x81') # not in cp1252
+
+def test_namedEntities():
+    assert (htmlDecoded(r'&eacute;') == '\u00E9')
+    assert (htmlDecoded(r'&nosuchname;') == r'&nosuchname;')
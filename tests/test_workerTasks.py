@@ -0,0 +1,106 @@
+
+# =============================================================================================
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# This script must/should come together with a copy of the GNU General Public License. If not,
+# access <http://www.gnu.org/licenses/> to find and read it.
+#
+# Author: Pedro Vernetti G.
+# Name: Metagedit
+# Description: gedit plugin which adds multiple improvements and functionalities to it
+#
+# #  In order to have this script working (if it is currently not), run 'install.sh'.
+# =============================================================================================
+#
+# Usage: python3 -m pytest tests
+# Worker processes import workerTasks.py outside of gedit, so it must work without gi.
+
+import os
+import sys
+import subprocess
+
+
+
+pluginFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), r'..', r'plugin', r'metagedit')
+
+# run by a fresh interpreter, where importing gi fails as it would without gedit's typelib
+_withoutGi = r'''
+import sys, types
+sys.modules['gi'] = None
+package = types.ModuleType('metagedit')
+package.__path__ = [%(folder)r]
+sys.modules['metagedit'] = package
+from metagedit import workerTasks, encodingsAndLanguages
+from metagedit.parallel import SharedBytes, SharedLines
+%(code)s
+assert not any(((name == 'gi') or name.startswith('gi.')) for name in sys.modules if sys.modules[name])
+print('ok')
+'''
+
+
+
+def runWithoutGi( code ):
+    script = _withoutGi % {r'folder': os.path.normpath(pluginFolder), r'code': code}
+    result = subprocess.run([sys.executable, r'-c', script], capture_output=True, text=True)
+    assert (result.returncode == 0), result.stderr
+    assert (result.stdout.strip() == r'ok'), result.stdout
+
+
+
+def test_encodingPenaltyWithoutGi():
+    runWithoutGi(r'''
+sample = ('Съешь же ещё этих мягких французских булок, да выпей чаю. ' * 200).encode('cp1251')
+letters = encodingsAndLanguages.scriptLetters('rus')
+with SharedBytes(sample) as shared:
+    penalty = lambda encoding: workerTasks._encodingPenalty((shared.name, 0, shared.size), encoding, letters)
+    assert (penalty('Windows-1251') < penalty('ISO-8859-1'))
+    assert (penalty('no such encoding') is None)
+''')
+
+def test_lineTasksWithoutGi():
+    runWithoutGi(r'''
+with SharedLines(['b', 'a', 'b', 'c'], 1) as shared:
+    partition = shared.partitions[0]
+    sortedPairs = workerTasks._sortedPartition(partition, False, ('Text', False, 0, None, ()))
+    assert ([line for key, line in sortedPairs] == ['a', 'b', 'b', 'c'])
+    kept = workerTasks._dedupedPartition(partition, True, False, 0)
+    assert ([i for i, digest in kept] == [0, 1, 3])
+''')
+
+# a chardet whose guess after each step is scripted, as (encoding, confidence)
+_scriptedChardet = r'''
+import types
+chardet = sys.modules['chardet'] = types.ModuleType('chardet')
+class UniversalDetector:
+    done = False
+    def __init__( self ): self.fed = 0
+    def feed( self, sample ): self.fed += 1
+    def close( self ):
+        encoding, confidence = guesses[self.fed - 1]
+        return {'encoding': encoding, 'confidence': confidence}
+chardet.UniversalDetector = UniversalDetector
+def detected( confidence=0.9 ):
+    steps = ([r'sample'] for guess in guesses)
+    return workerTasks._detectedEncoding(steps, 'utf-8', confidence)
+'''
+
+def test_detectionStopsWhenBiggerSampleAgrees():
+    runWithoutGi(_scriptedChardet + r'''
+guesses = [('Windows-1252', 0.2), ('Windows-1251', 0.2), ('Windows-1251', 0.21), ('KOI8-R', 0.3)]
+assert (detected() == ('Windows-1251', 0.21, 18))
+guesses = [('Windows-1252', 0.2), ('Windows-1251', 0.2), ('KOI8-R', 0.3)]
+assert (detected() == ('KOI8-R', 0.3, 18))
+guesses = [(None, 0), (None, 0), ('ISO-8859-7', 0.18)]
+assert (detected() == ('ISO-8859-7', 0.18, 18))
+''')
+
+def test_detectionStopsWhenConfident():
+    runWithoutGi(_scriptedChardet + r'''
+guesses = [('Windows-1252', 0.2), ('Windows-1251', 0.95), ('KOI8-R', 0.3)]
+assert (detected() == ('Windows-1251', 0.95, 12))
+assert (detected(0.1) == ('Windows-1252', 0.2, 6))
+''')